@@ -0,0 +1,47 @@
+"""add transactional email outbox
+
+Revision ID: 0004_email_outbox
+Revises: 0003_user_verification_and_flags
+Create Date: 2026-10-18 09:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_email_outbox"
+down_revision = "0003_user_verification_and_flags"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "email_outbox",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("recipient", sa.String(length=320), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False, server_default=sa.text("'pending'")),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+        sa.Column("last_error", sa.String(length=500), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.text("CURRENT_TIMESTAMP")),
+        sa.Column("sent_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_email_outbox_id", "email_outbox", ["id"], unique=False)
+    op.create_index(
+        "ix_email_outbox_status_next_attempt_at",
+        "email_outbox",
+        ["status", "next_attempt_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_email_outbox_status_next_attempt_at", table_name="email_outbox")
+    op.drop_index("ix_email_outbox_id", table_name="email_outbox")
+    op.drop_table("email_outbox")
@@ -0,0 +1,67 @@
+"""add partial and prefix indexes for the admin user listing
+
+Revision ID: 0005_user_listing_indexes
+Revises: 0004_email_outbox
+Create Date: 2026-10-18 12:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005_user_listing_indexes"
+down_revision = "0004_email_outbox"
+branch_labels = None
+depends_on = None
+
+# Same predicates as the admin filters so the planner can match them (IS 1 / IS true per dialect)
+_PARTIAL_INDEXES = {
+    "ix_users_banned_id": sa.column("is_banned").is_(True),
+    "ix_users_kyc_pending_id": sa.and_(
+        sa.column("kyc_submitted_at").is_not(None), sa.column("kyc_verified_at").is_(None)
+    ),
+    "ix_users_unconfirmed_id": sa.column("is_email_confirmed").is_(False),
+}
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    for name, where in _PARTIAL_INDEXES.items():
+        op.create_index(
+            name,
+            "users",
+            ["id"],
+            unique=False,
+            sqlite_where=where,
+            postgresql_where=where,
+        )
+    if _is_postgres():
+        # LIKE 'prefix%' can only use a btree under the C collation or *_pattern_ops
+        op.create_index(
+            "ix_users_email_pattern",
+            "users",
+            ["email"],
+            unique=False,
+            postgresql_ops={"email": "varchar_pattern_ops"},
+        )
+        op.create_index(
+            "ix_users_nickname_pattern",
+            "users",
+            ["nickname"],
+            unique=False,
+            postgresql_ops={"nickname": "varchar_pattern_ops"},
+        )
+
+
+def downgrade() -> None:
+    if _is_postgres():
+        op.drop_index("ix_users_nickname_pattern", table_name="users")
+        op.drop_index("ix_users_email_pattern", table_name="users")
+    for name in reversed(list(_PARTIAL_INDEXES)):
+        op.drop_index(name, table_name="users")
@@ -0,0 +1,46 @@
+"""add composite and partial indexes for verification/reset code lookups
+
+Revision ID: 0006_code_lookup_indexes
+Revises: 0005_user_listing_indexes
+Create Date: 2026-10-18 13:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_code_lookup_indexes"
+down_revision = "0005_user_listing_indexes"
+branch_labels = None
+depends_on = None
+
+_TABLES = ("user_verification_codes", "admin_reset_codes")
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def upgrade() -> None:
+    for table in _TABLES:
+        # Every predicate of the code lookup, equality columns first and the expiry range last
+        op.create_index(f"ix_{table}_lookup", table, ["user_id", "code", "used", "expires_at"], unique=False)
+        if _is_postgres():
+            # Only unused codes are ever looked up; the partial index stays small as codes get consumed
+            op.create_index(
+                f"ix_{table}_active",
+                table,
+                ["user_id", "code", "expires_at"],
+                unique=False,
+                postgresql_where=sa.text("used IS false"),
+            )
+
+
+def downgrade() -> None:
+    for table in reversed(_TABLES):
+        if _is_postgres():
+            op.drop_index(f"ix_{table}_active", table_name=table)
+        op.drop_index(f"ix_{table}_lookup", table_name=table)
@@ -0,0 +1,34 @@
+"""add per-user access token epoch
+
+Revision ID: 0008_user_token_version
+Revises: 0007_refresh_tokens
+Create Date: 2026-10-18 15:00:00.000000
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008_user_token_version"
+down_revision = "0007_refresh_tokens"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("token_version", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.add_column("users", sa.Column("token_version_changed_at", sa.DateTime(), nullable=True))
+    op.create_index("ix_users_token_version_changed_at", "users", ["token_version_changed_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_token_version_changed_at", table_name="users")
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("token_version_changed_at")
+        batch.drop_column("token_version")
@@ -0,0 +1,93 @@
+"""
+Reproducible import-time report for `import main`.
+
+    python -m benchmarks.import_time --runs 5 --top 25
+
+Each run is a fresh interpreter with `-X importtime`, a throwaway SQLite
+database and DB_MAINTENANCE=skip, so only import cost is measured. Prints the
+median wall time and the slowest top-level packages by cumulative time
+(median across runs).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+_PROBE = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def measure_once(target: str = "main") -> Tuple[float, Dict[str, int]]:
+    """Wall seconds for `import <target>` plus cumulative microseconds per top-level package."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{Path(tmp) / 'import.db'}",
+            "DB_MAINTENANCE": "skip",
+            "RESET_DB": "0",
+            "LOG_LEVEL": "WARNING",
+            "PYTHONDONTWRITEBYTECODE": "1",
+        }
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.replace("main", target)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    packages: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:") :].split("|"))
+        # A top-level module's cumulative time already includes its submodules
+        if cumulative.isdigit() and "." not in name:
+            packages[name] = max(packages.get(name, 0), int(cumulative))
+    return float(proc.stdout.strip().splitlines()[-1]), packages
+
+
+def report(runs: int) -> Dict[str, object]:
+    walls: List[float] = []
+    per_package: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(runs):
+        wall, packages = measure_once()
+        walls.append(wall)
+        for name, micros in packages.items():
+            per_package[name].append(micros)
+    medians = {name: statistics.median(values) for name, values in per_package.items()}
+    return {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "wall_seconds_median": statistics.median(walls),
+        "wall_seconds_min": min(walls),
+        "packages_ms": {name: round(micros / 1000, 2) for name, micros in sorted(medians.items(), key=lambda kv: -kv[1])},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", type=Path, help="also write the full report to this file")
+    args = parser.parse_args()
+
+    result = report(args.runs)
+    print(f"import main: median {result['wall_seconds_median']:.3f}s, min {result['wall_seconds_min']:.3f}s ({args.runs} runs)")
+    for name, ms in list(result["packages_ms"].items())[: args.top]:
+        print(f"  {name:30s} {ms:9.1f} ms")
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+"""
+Replay the journeys from files/collection.json as weighted, concurrent virtual users.
+
+    python -m benchmarks.load_test --users 20 --duration 30
+    python -m benchmarks.load_test --target uvicorn --workers 2 --users 50 --duration 60
+    python -m benchmarks.load_test --save                       # write benchmarks/baselines/load_test.json
+    python -m benchmarks.load_test --compare benchmarks/baselines/load_test.json --max-regression 25
+
+Each virtual user (VU) registers its own admin and player first (not measured).
+It then loops until --duration runs out, each time picking a scenario by weight
+and running its collection steps in order.
+
+The app runs against a fresh SQLite file, or --database-url. SMTP points at a
+local aiosmtpd sink. Verification codes are read back from the sink, so
+"User Confirm Email" goes through the real outbox and mailer. The time spent
+waiting for the mail is reported as "(mail delivery)".
+
+--target asgi drives `main.app` in this process over httpx's ASGI transport,
+so client and server share one event loop. It is handy for comparing code
+changes, not for absolute numbers. --target uvicorn starts a local uvicorn
+(optionally with several workers) and goes over TCP.
+
+Baselines are machine-specific and are not committed. CI keeps the JSON
+saved on the main branch as an artifact. Later runs on the same runner class
+--compare against it, with enough --users and --duration that p95 means
+something.
+
+Requires `aiosmtpd` and `httpx`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import email
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+ROOT = Path(__file__).resolve().parent.parent
+
+COLLECTION_PATH = ROOT / "files" / "collection.json"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baselines" / "load_test.json"
+
+# The collection hardcodes one player/admin; per-VU variables keep concurrent VUs off each other's rows
+IDENTITY_REWRITES = {
+    "player@skill2win.gg": "{{user_email}}",
+    "player1": "{{user_nickname}}",
+    "admin@skill2win.gg": "{{admin_email}}",
+    '"user_id": 1': '"user_id": {{user_id}}',
+}
+
+# name -> (default weight, collection steps)
+SCENARIOS: Dict[str, tuple[int, List[str]]] = {
+    "signup": (
+        3,
+        ["User Register", "User Resend Code", "User Confirm Email", "User Login", "User Me", "User Submit KYC"],
+    ),
+    "returning_user": (6, ["User Login", "User Me", "User Me", "User Me"]),
+    "moderation": (1, ["Admin Login", "Admin Me", "Admin Verify User", "Admin Ban User", "Admin Unban User"]),
+    "admin_reset": (1, ["Admin Reset Code (optional)"]),
+}
+SETUP_STEPS = ["Admin Register", *SCENARIOS["signup"][1]]
+
+# step -> {variable: response field}
+CAPTURES = {
+    "User Login": {"user_token": "access_token"},
+    "User Me": {"user_id": "id"},
+    "Admin Login": {"admin_token": "access_token"},
+}
+# Steps that make the app send a verification code to {{user_email}}
+CODE_MAILS = {"User Register", "User Resend Code"}
+NEW_USER_STEP = "User Register"
+
+MAIL_DELIVERY = "(mail delivery)"
+# Run parameters that must match for a baseline comparison to mean anything
+COMPARABLE_META = ("target", "workers", "users", "weights", "bcrypt_rounds", "database", "cpu_count")
+_VARIABLE = re.compile(r"\{\{(\w+)\}\}")
+_CODE = re.compile(r"\b(\d{6})\b")
+
+
+class Step:
+    def __init__(self, name: str, method: str, path: str, headers: Dict[str, str], body: Optional[str]) -> None:
+        self.name = name
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def render(self, variables: Dict[str, Any]) -> tuple[str, Dict[str, str], Optional[bytes]]:
+        def fill(template: str) -> str:
+            return _VARIABLE.sub(lambda match: str(variables.get(match.group(1), "")), template)
+
+        headers = {key: fill(value) for key, value in self.headers.items()}
+        body = None
+        if self.body is not None:
+            body = fill(self.body).encode()
+            headers.setdefault("Content-Type", "application/json")
+        return fill(self.path), headers, body
+
+
+def load_collection(path: Path = COLLECTION_PATH) -> Dict[str, Step]:
+    """Collection items by name, with identities rewritten to per-VU variables."""
+    collection = json.loads(Path(path).read_text(encoding="utf-8"))
+    steps: Dict[str, Step] = {}
+    for item in collection["item"]:
+        request = item["request"]
+        url = request["url"] if isinstance(request["url"], str) else request["url"]["raw"]
+        body = (request.get("body") or {}).get("raw")
+        if body is not None:
+            for literal, variable in IDENTITY_REWRITES.items():
+                body = body.replace(literal, variable)
+        headers = {header["key"]: header["value"] for header in request.get("header", []) if not header.get("disabled")}
+        steps[item["name"]] = Step(item["name"], request["method"], url.replace("{{base_url}}", ""), headers, body)
+    return steps
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return math.nan
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class StepStats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Counter[str] = Counter()
+
+    def record(self, seconds: float, status: str, ok: bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        return {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2) if ordered else None,
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2) if ordered else None,
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2) if ordered else None,
+            "max_ms": round(ordered[-1] * 1000, 2) if ordered else None,
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+class MailSink:
+    """aiosmtpd handler that keeps every 6-digit code received, per recipient, in arrival order."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[str, List[str]] = defaultdict(list)
+        self.messages = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        message = email.message_from_bytes(envelope.original_content or envelope.content)
+        part = next((p for p in message.walk() if p.get_content_type() == "text/plain"), message)
+        match = _CODE.search(part.get_payload(decode=True).decode(errors="replace"))
+        self.messages += 1
+        if match:
+            for recipient in envelope.rcpt_tos:
+                self.codes[recipient.lower()].append(match.group(1))
+        return "250 OK"
+
+    async def wait_for_code(self, recipient: str, nth: int, timeout: float) -> str:
+        deadline = time.perf_counter() + timeout
+        codes = self.codes[recipient.lower()]
+        while len(codes) < nth:
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"No mail #{nth} for {recipient} within {timeout}s")
+            await asyncio.sleep(0.005)
+        return codes[nth - 1]
+
+
+class VirtualUser:
+    def __init__(self, index: int, run_id: str, client, steps: Dict[str, Step], sink: MailSink, stats, mail_timeout: float) -> None:
+        self.index = index
+        self.run_id = run_id
+        self.client = client
+        self.steps = steps
+        self.sink = sink
+        self.stats = stats
+        self.mail_timeout = mail_timeout
+        self.seq = 0
+        self.codes_requested = 0
+        self.variables: Dict[str, Any] = {"admin_email": f"lt-{run_id}-admin{index}@skill2win.gg"}
+
+    def _new_user(self) -> None:
+        self.seq += 1
+        self.codes_requested = 0
+        self.variables["user_email"] = f"lt-{self.run_id}-{self.index}-{self.seq}@skill2win.gg"
+        self.variables["user_nickname"] = f"lt{self.run_id}v{self.index}n{self.seq}"
+
+    async def run_step(self, name: str, *, measured: bool = True) -> bool:
+        step = self.steps[name]
+        if name == NEW_USER_STEP:
+            self._new_user()
+        if step.body and "{{verification_code}}" in step.body:
+            start = time.perf_counter()
+            try:
+                self.variables["verification_code"] = await self.sink.wait_for_code(
+                    self.variables["user_email"], self.codes_requested, self.mail_timeout
+                )
+            except TimeoutError:
+                if measured:
+                    self.stats[MAIL_DELIVERY].record(time.perf_counter() - start, "timeout", False)
+                return False
+            if measured:
+                self.stats[MAIL_DELIVERY].record(time.perf_counter() - start, "delivered", True)
+        path, headers, body = step.render(self.variables)
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(step.method, path, headers=headers, content=body)
+        except Exception as exc:
+            if measured:
+                self.stats[name].record(time.perf_counter() - start, exc.__class__.__name__, False)
+            return False
+        elapsed = time.perf_counter() - start
+        ok = response.is_success
+        if measured:
+            self.stats[name].record(elapsed, str(response.status_code), ok)
+        if ok:
+            if name in CODE_MAILS:
+                self.codes_requested += 1
+            if name in CAPTURES:
+                payload = response.json()
+                for variable, field in CAPTURES[name].items():
+                    self.variables[variable] = payload[field]
+        return ok
+
+    async def run_steps(self, names: Sequence[str], *, measured: bool = True) -> bool:
+        for name in names:
+            if not await self.run_step(name, measured=measured):
+                return False  # later steps depend on this one's captures
+        return True
+
+
+async def _run_load(client, sink: MailSink, args, weights: Dict[str, int]) -> Dict[str, Any]:
+    steps = load_collection()
+    stats: Dict[str, StepStats] = defaultdict(StepStats)
+    iterations: Counter[str] = Counter()
+    failed: Counter[str] = Counter()
+    run_id = f"{int(time.time()) % 100000}{random.randint(0, 99)}"
+    users = [VirtualUser(i, run_id, client, steps, sink, stats, args.mail_timeout) for i in range(args.users)]
+
+    setup = await asyncio.gather(*(user.run_steps(SETUP_STEPS, measured=False) for user in users))
+    if not all(setup):
+        raise RuntimeError(f"Setup failed for {setup.count(False)} of {len(users)} virtual users")
+
+    names = [name for name, weight in weights.items() if weight > 0]
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    async def loop(user: VirtualUser) -> None:
+        while time.perf_counter() < deadline:
+            scenario = rng.choices(names, weights=[weights[name] for name in names])[0]
+            iterations[scenario] += 1
+            if not await user.run_steps(SCENARIOS[scenario][1]):
+                failed[scenario] += 1
+
+    await asyncio.gather(*(loop(user) for user in users))
+    elapsed = time.perf_counter() - started
+
+    everything = StepStats()
+    for name, step_stats in stats.items():
+        if name == MAIL_DELIVERY:
+            continue
+        everything.latencies.extend(step_stats.latencies)
+        everything.errors += step_stats.errors
+        everything.statuses.update(step_stats.statuses)
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "totals": everything.summary(elapsed),
+        "scenarios": {name: {"iterations": iterations[name], "failed": failed[name]} for name in names},
+        "steps": {name: stats[name].summary(elapsed) for name in sorted(stats)},
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_environment(database_url: str, smtp_port: int, bcrypt_rounds: Optional[int]) -> Dict[str, str]:
+    env = {
+        "DATABASE_URL": database_url,
+        "DB_MAINTENANCE": "update",
+        "RESET_DB": "0",
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_START_TLS": "false",
+        "SMTP_USER": "",
+        "SMTP_PASSWORD": "",
+        "SENDER_EMAIL": "loadtest@skill2win.gg",
+        "OUTBOX_WORKER_ENABLED": "true",
+        "CODE_PURGE_ENABLED": "false",
+        # Every VU comes from the same address; the limiter would otherwise dominate the results
+        "RATE_LIMIT_REQUESTS": "1000000000",
+        "LOG_LEVEL": "WARNING",
+    }
+    if bcrypt_rounds is not None:
+        env["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    return env
+
+
+async def _run_asgi(args, sink: MailSink, weights: Dict[str, int]) -> Dict[str, Any]:
+    import httpx
+
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.request_timeout) as client:
+            return await _run_load(client, sink, args, weights)
+
+
+async def _wait_until_up(url: str, timeout: float) -> None:
+    import httpx
+
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=1) as client:
+        while True:
+            try:
+                await client.get("/protected")
+                return
+            except httpx.TransportError:
+                if time.perf_counter() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def _run_uvicorn(args, sink: MailSink, weights: Dict[str, int], env: Dict[str, str]) -> Dict[str, Any]:
+    import httpx
+
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    command += ["--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    server = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env})
+    try:
+        await _wait_until_up(url, timeout=60)
+        limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+        async with httpx.AsyncClient(base_url=url, timeout=args.request_timeout, limits=limits) as client:
+            return await _run_load(client, sink, args, weights)
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_weights(spec: Optional[str]) -> Dict[str, int]:
+    weights = {name: weight for name, (weight, _) in SCENARIOS.items()}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; expected one of {', '.join(SCENARIOS)}")
+        weights[name] = int(weight)
+    return weights
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: Optional[float] = None) -> List[str]:
+    """Print per-step p95/throughput deltas; returns the steps whose p95 grew by more than `max_regression` %."""
+    regressions = []
+    print(f"\nvs baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('created_at')}):")
+    differing = [key for key in COMPARABLE_META if current["meta"].get(key) != baseline["meta"].get(key)]
+    if differing:
+        print(f"  warning: runs differ in {', '.join(differing)}; deltas are not like for like")
+    for name, now in current["steps"].items():
+        before = baseline["steps"].get(name)
+        if not before or not before.get("p95_ms") or not now.get("p95_ms"):
+            continue
+        p95_delta = (now["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else math.nan
+        rps_delta = (now["rps"] / before["rps"] - 1) * 100 if before["rps"] else math.nan
+        flag = ""
+        # Mail delivery mostly reflects outbox polling; it is shown but never fails the run
+        if max_regression is not None and name != MAIL_DELIVERY and p95_delta > max_regression:
+            regressions.append(name)
+            flag = "  <-- regression"
+        print(f"  {name:28s} p95 {before['p95_ms']:8.1f} -> {now['p95_ms']:8.1f} ms ({p95_delta:+6.1f}%)  rps {rps_delta:+6.1f}%{flag}")
+    return regressions
+
+
+def report(result: Dict[str, Any]) -> None:
+    meta = result["meta"]
+    print(f"{meta['target']} | {meta['users']} VUs | {result['elapsed_seconds']}s | bcrypt rounds {meta['bcrypt_rounds']}")
+    print(f"{'step':28s} {'req':>6s} {'err':>5s} {'rps':>8s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}  (ms)")
+    for name, row in [*result["steps"].items(), ("TOTAL", result["totals"])]:
+        cells = [f"{row[key]:8.1f}" if row[key] is not None else f"{'-':>8s}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"{name:28s} {row['requests']:6d} {row['errors']:5d} {row['rps']:8.1f} {' '.join(cells)}")
+    for name, counts in result["scenarios"].items():
+        print(f"  scenario {name}: {counts['iterations']} iterations, {counts['failed']} failed")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (--target uvicorn)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of measured load after setup")
+    parser.add_argument("--weights", help="scenario weights, e.g. signup=1,returning_user=8,moderation=1,admin_reset=0")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bcrypt-rounds", type=int, help="BCRYPT_ROUNDS for the app (default: app default)")
+    parser.add_argument("--database-url", help="default: a fresh SQLite file in a temp dir")
+    parser.add_argument("--mail-timeout", type=float, default=15)
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--save", nargs="?", const=str(DEFAULT_BASELINE), help=f"write JSON results (default path: {DEFAULT_BASELINE.relative_to(ROOT)})")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    parser.add_argument("--max-regression", type=float, help="exit 1 if any step's p95 grew by more than this %% vs --compare")
+    args = parser.parse_args(argv)
+    weights = _parse_weights(args.weights)
+
+    import logging
+
+    from aiosmtpd.controller import Controller
+
+    logging.getLogger("mail.log").setLevel(logging.WARNING)
+    sink = MailSink()
+    controller = Controller(sink, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    with tempfile.TemporaryDirectory(prefix="pm-loadtest-") as tmp:
+        database_url = args.database_url or f"sqlite:///{Path(tmp) / 'loadtest.db'}"
+        env = app_environment(database_url, controller.port, args.bcrypt_rounds)
+        try:
+            if args.target == "asgi":
+                # config reads the environment once, when the app is first imported
+                os.environ.update(env)
+                result = asyncio.run(_run_asgi(args, sink, weights))
+            else:
+                result = asyncio.run(_run_uvicorn(args, sink, weights, env))
+        finally:
+            controller.stop()
+
+    result = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "target": args.target,
+            "workers": args.workers if args.target == "uvicorn" else 1,
+            "users": args.users,
+            "duration": args.duration,
+            "weights": weights,
+            "seed": args.seed,
+            "bcrypt_rounds": args.bcrypt_rounds or int(os.getenv("BCRYPT_ROUNDS", "12")),
+            "database": "sqlite" if database_url.startswith("sqlite") else database_url.split(":", 1)[0],
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **result,
+    }
+    report(result)
+
+    exit_code = 0
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(result, baseline, args.max_regression):
+            exit_code = 1
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(result, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        print(f"\nsaved {path}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
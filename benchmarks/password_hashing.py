@@ -0,0 +1,55 @@
+"""
+bcrypt throughput per work factor, single-threaded and across all cores.
+
+    python -m benchmarks.password_hashing --rounds 10 11 12 --seconds 2
+
+Per-core figures divide the parallel rate by the thread count; bcrypt releases
+the GIL, so they should stay close to the single-thread rate. The last column
+is what BCRYPT_CALIBRATE would pick for --target-ms on this machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.security import build_pwd_context, calibrate_bcrypt_rounds
+
+
+def _hashes_in(seconds: float, rounds: int) -> int:
+    context = build_pwd_context(rounds)
+    deadline = time.perf_counter() + seconds
+    done = 0
+    while time.perf_counter() < deadline:
+        context.hash("Pass12345")
+        done += 1
+    return done
+
+
+def _rate(rounds: int, seconds: float, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(executor.map(_hashes_in, [seconds] * threads, [rounds] * threads))
+    return total / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--target-ms", type=float, default=250.0)
+    args = parser.parse_args()
+
+    print(f"{'rounds':>6} {'ms/hash':>9} {'1 thread/s':>11} {f'{args.threads} threads/s':>13} {'per core/s':>11}")
+    for rounds in args.rounds:
+        single = _rate(rounds, args.seconds, 1)
+        parallel = _rate(rounds, args.seconds, args.threads)
+        print(f"{rounds:>6} {1000 / single:>9.1f} {single:>11.1f} {parallel:>13.1f} {parallel / args.threads:>11.1f}")
+    print(f"calibrated for {args.target_ms:.0f} ms: {calibrate_bcrypt_rounds(args.target_ms)} rounds")
+
+
+if __name__ == "__main__":
+    main()
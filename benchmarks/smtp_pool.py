@@ -0,0 +1,81 @@
+"""
+Compare one-connection-per-email against the pooled mailer on a local SMTP sink.
+
+    python -m benchmarks.smtp_pool --messages 200 --concurrency 4
+
+Requires `aiosmtpd` (the sink). No real mail leaves the machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiosmtplib  # noqa: E402
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from utils.mailer import SMTPConnectionPool, build_email_message  # noqa: E402
+
+
+class _Sink:
+    async def handle_DATA(self, server, session, envelope):
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _per_message(host: str, port: int, messages, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(msg):
+        async with semaphore:
+            smtp = aiosmtplib.SMTP(hostname=host, port=port, start_tls=False)
+            await smtp.connect()
+            await smtp.send_message(msg)
+            await smtp.quit()
+
+    await asyncio.gather(*(send(msg) for msg in messages))
+
+
+async def _pooled(host: str, port: int, messages, concurrency: int) -> None:
+    pool = SMTPConnectionPool(hostname=host, port=port, start_tls=False, size=concurrency)
+    await asyncio.gather(*(pool.send(msg) for msg in messages))
+    await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.getLogger("mail.log").setLevel(logging.WARNING)
+    controller = Controller(_Sink(), hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        messages = [
+            build_email_message("Bench", f"user{i}@skill2win.gg", "body", "verification_code.html", {"verification_code": "123456"})
+            for i in range(args.messages)
+        ]
+        for name, runner in (("per-message", _per_message), ("pooled", _pooled)):
+            start = time.perf_counter()
+            asyncio.run(runner(controller.hostname, controller.port, messages, args.concurrency))
+            elapsed = time.perf_counter() - start
+            print(f"{name:12s} {args.messages} msgs in {elapsed:.3f}s -> {args.messages / elapsed:8.1f} msg/s")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -47,15 +47,78 @@ def _resolve_database_url() -> str:
     return f"sqlite:///{BASE_DIR / sqlite_name}"
 
 
+def _resolve_async_database_url(sync_url: str) -> str:
+    url = os.getenv("ASYNC_DATABASE_URL")
+    if url:
+        return url
+    if sync_url.startswith("postgresql+psycopg2://"):
+        return sync_url.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+    if sync_url.startswith("sqlite:///"):
+        return sync_url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return sync_url
+
+
 _load_environment()
 
 DATABASE_URL = _resolve_database_url()
+ASYNC_DATABASE_URL = _resolve_async_database_url(DATABASE_URL)
 SQL_ECHO = os.getenv("SQL_DEBUG", "").lower() == "true"
 
+# Connection pool (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+
+# SQLite tuning (applied on every new connection)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+
+# Per-request SQL instrumentation
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+# Warn when one request runs the same (normalized) statement this many times; 0 disables
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "3"))
+
 # JWT / auth defaults (kept minimal; extend as needed)
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Used/revoked refresh tokens are kept this long to detect replays, then purged
+REFRESH_TOKEN_REUSE_WINDOW_DAYS = float(os.getenv("REFRESH_TOKEN_REUSE_WINDOW_DAYS", "7"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "4096"))
+
+# Password hashing pool (bcrypt runs off the request threadpool)
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+HASH_POOL_QUEUE_SIZE = int(os.getenv("HASH_POOL_QUEUE_SIZE", "64"))
+
+# bcrypt work factor: fixed via BCRYPT_ROUNDS, or measured at startup to hit BCRYPT_TARGET_MS per hash
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_CALIBRATE = os.getenv("BCRYPT_CALIBRATE", "false").lower() == "true"
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "15"))
+# Calibration result is stored here and reused on later boots (delete it to re-measure)
+BCRYPT_CALIBRATION_FILE = os.getenv("BCRYPT_CALIBRATION_FILE", str(BASE_DIR / ".bcrypt_calibration.json"))
+# Hashes within ±this many rounds of the current cost are not rehashed on login
+BCRYPT_REHASH_TOLERANCE = int(os.getenv("BCRYPT_REHASH_TOLERANCE", "1"))
+
+# Stateless auth: flags + token_version travel in the access token; revocations are polled from the DB
+STATELESS_AUTH = os.getenv("STATELESS_AUTH", "false").lower() == "true"
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+# Without a successful refresh for this long, token epochs are checked against the DB instead
+REVOCATION_STALE_AFTER_SECONDS = float(
+    os.getenv("REVOCATION_STALE_AFTER_SECONDS", str(3 * REVOCATION_REFRESH_SECONDS))
+)
+
+# Principal cache used by auth dependencies (0 disables)
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
 
 # SMTP / Email
 SMTP_HOST = os.getenv("SMTP_HOST")
@@ -63,6 +126,31 @@ SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL", SMTP_USER or "no-reply@example.com")
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_POOL_MAX_IDLE_SECONDS = float(os.getenv("SMTP_POOL_MAX_IDLE_SECONDS", "240"))
+SMTP_POOL_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_POOL_NOOP_AFTER_SECONDS", "15"))
+
+# Email outbox delivery worker
+OUTBOX_WORKER_ENABLED = os.getenv("OUTBOX_WORKER_ENABLED", "true").lower() == "true"
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "10"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+# Sent and dead-lettered rows are purged by the code purge job after this many days
+OUTBOX_RETENTION_DAYS = float(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+# Expired/used verification and reset code purge
+CODE_PURGE_ENABLED = os.getenv("CODE_PURGE_ENABLED", "true").lower() == "true"
+CODE_PURGE_INTERVAL_SECONDS = float(os.getenv("CODE_PURGE_INTERVAL_SECONDS", "900"))
+CODE_PURGE_BATCH_SIZE = int(os.getenv("CODE_PURGE_BATCH_SIZE", "500"))
+CODE_PURGE_TIME_BUDGET_SECONDS = float(os.getenv("CODE_PURGE_TIME_BUDGET_SECONDS", "5"))
+
+# Admin bulk moderation
+BULK_MODERATION_CHUNK_SIZE = int(os.getenv("BULK_MODERATION_CHUNK_SIZE", "500"))
 
 # CORS
 ALLOWED_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
@@ -70,3 +158,19 @@ ALLOWED_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",")
 # Rate limiting
 RATE_LIMIT_REQUESTS = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))
 RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SWEEP_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+# memory (per worker) | shared (mmap table shared by all workers on the host)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_SHARED_PATH = os.getenv("RATE_LIMIT_SHARED_PATH")
+RATE_LIMIT_SHARED_SLOTS = int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "65536"))
+
+# Metrics (/metrics, Prometheus text format)
+# Off by default: the endpoint exposes traffic, pool and queue internals of an auth API
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+# When set, scrapes must send `Authorization: Bearer <METRICS_TOKEN>`
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+# Shared directory for multi-worker deployments: each worker flushes its series there and
+# /metrics sums all of them; unset = the scraped worker reports only itself
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
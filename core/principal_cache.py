@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from config import PRINCIPAL_CACHE_MAX_ENTRIES, PRINCIPAL_CACHE_TTL_SECONDS
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Immutable snapshot of the auth-relevant columns of a `User` row."""
+
+    id: int
+    email: str
+    nickname: str
+    is_active: bool
+    is_admin: bool
+    is_email_confirmed: bool
+    is_verified_account: bool
+    is_banned: bool
+    auth_provider: str
+
+    @classmethod
+    def from_user(cls, user: Any) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            nickname=user.nickname,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            is_email_confirmed=user.is_email_confirmed,
+            is_verified_account=user.is_verified_account,
+            is_banned=user.is_banned,
+            auth_provider=user.auth_provider,
+        )
+
+    def to_claims(self, token_version: int) -> Dict[str, Any]:
+        """JWT claims that let `from_claims` rebuild this principal without a DB read."""
+        return {
+            "uid": self.id,
+            "tv": token_version,
+            "nick": self.nickname,
+            "act": self.is_active,
+            "adm": self.is_admin,
+            "conf": self.is_email_confirmed,
+            "kyc": self.is_verified_account,
+            "ban": self.is_banned,
+            "prov": self.auth_provider,
+        }
+
+    @classmethod
+    def from_claims(cls, payload: Dict[str, Any]) -> "Principal":
+        return cls(
+            id=payload["uid"],
+            email=payload["sub"],
+            nickname=payload["nick"],
+            is_active=payload["act"],
+            is_admin=payload["adm"],
+            is_email_confirmed=payload["conf"],
+            is_verified_account=payload["kyc"],
+            is_banned=payload["ban"],
+            auth_provider=payload["prov"],
+        )
+
+
+class PrincipalCache:
+    """
+    Bounded TTL + LRU cache of principals keyed by token subject (email).
+
+    The cache is per process: logic functions invalidate entries after every
+    write that changes auth flags, and the TTL bounds staleness for writes made
+    by other workers.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Principal]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, principal: Principal) -> Principal:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return principal
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, principal)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return principal
+
+    def put_user(self, user: Any) -> Principal:
+        return self.put(user.email, Principal.from_user(user))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+principal_cache = PrincipalCache(
+    max_entries=PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS,
+)
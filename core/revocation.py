@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from config import ACCESS_TOKEN_EXPIRE_MINUTES, REVOCATION_REFRESH_SECONDS, REVOCATION_STALE_AFTER_SECONDS
+from database import SessionLocal
+from models import User
+from utils.logger import logger
+
+# Rows committed slightly out of timestamp order are still picked up by the next poll
+_POLL_OVERLAP = timedelta(seconds=30)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything here is stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+class RevocationTable:
+    """
+    Per-process map of user id -> current `token_version`, for stateless auth.
+
+    Only users whose epoch changed within the access token lifetime are kept:
+    older tokens have expired anyway, so the table stays as small as the recent
+    bans and password resets. Local writes call `bump`; changes made by other
+    workers arrive through an incremental poll on `token_version_changed_at`.
+
+    The table is only trusted while `is_fresh`: until the first refresh succeeds,
+    or once polling has failed for `stale_after` seconds, callers must check the
+    DB instead.
+    """
+
+    def __init__(
+        self,
+        *,
+        refresh_interval: float = REVOCATION_REFRESH_SECONDS,
+        stale_after: float = REVOCATION_STALE_AFTER_SECONDS,
+        retention: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.refresh_interval = refresh_interval
+        self.stale_after = stale_after
+        self.retention = retention
+        self.session_factory = session_factory
+        self._versions: Dict[int, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+        self._since: datetime | None = None
+        self._refreshed_at: float | None = None
+        self._poller: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._versions)
+
+    def bump(self, user_id: int, token_version: int, changed_at: datetime | None = None) -> None:
+        changed_at = changed_at or datetime.now(timezone.utc)
+        with self._lock:
+            current = self._versions.get(user_id)
+            if current is None or current[0] < token_version:
+                self._versions[user_id] = (token_version, changed_at)
+
+    def is_fresh(self) -> bool:
+        """Whether the last successful refresh is recent enough to skip the DB (always, without polling)."""
+        if self.refresh_interval <= 0:
+            return True
+        refreshed_at = self._refreshed_at
+        return refreshed_at is not None and time.monotonic() - refreshed_at <= self.stale_after
+
+    def is_revoked(self, user_id: int, token_version: int) -> bool:
+        if self._poller is None and self.refresh_interval > 0:
+            self._start_poller()
+        entry = self._versions.get(user_id)
+        return entry is not None and token_version < entry[0]
+
+    def _changes_since(self, since: datetime) -> Iterable[Tuple[int, int, datetime]]:
+        with self.session_factory() as db:
+            return db.execute(
+                select(User.id, User.token_version, User.token_version_changed_at).where(
+                    User.token_version_changed_at > since
+                )
+            ).all()
+
+    def refresh(self) -> int:
+        """Pull epoch changes since the last poll and drop entries past the token lifetime."""
+        now = datetime.now(timezone.utc)
+        since = self._since or now - self.retention
+        rows = list(self._changes_since(since))
+        for user_id, token_version, changed_at in rows:
+            self.bump(user_id, token_version, _as_utc(changed_at))
+        self._since = now - _POLL_OVERLAP
+        self._refreshed_at = time.monotonic()
+        horizon = now - self.retention
+        with self._lock:
+            expired = [user_id for user_id, (_, changed_at) in self._versions.items() if changed_at < horizon]
+            for user_id in expired:
+                del self._versions[user_id]
+        return len(rows)
+
+    def start(self) -> None:
+        """Load recent epoch changes before serving, then keep polling in the background."""
+        try:
+            self.refresh()
+        except Exception as exc:
+            # Requests fall back to the DB check until a poll succeeds
+            logger.warning("Initial token revocation refresh failed: %s", exc)
+        if self.refresh_interval > 0:
+            self._start_poller()
+
+    def stop(self, timeout: float | None = 10) -> None:
+        self._stop.set()
+        with self._lock:
+            poller, self._poller = self._poller, None
+        if poller is not None:
+            poller.join(timeout)
+
+    def _start_poller(self) -> None:
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._stop.clear()
+            self._poller = threading.Thread(target=self._poll_loop, name="token-revocations", daemon=True)
+            self._poller.start()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as exc:  # pragma: no cover - keep polling through DB hiccups
+                logger.warning("Token revocation refresh failed: %s", exc)
+            self._stop.wait(self.refresh_interval)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._since = None
+            self._refreshed_at = None
+
+
+revocation_table = RevocationTable()
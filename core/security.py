@@ -1,22 +1,237 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, TypeVar
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
 
-from config import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
+from config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    BCRYPT_CALIBRATE,
+    BCRYPT_CALIBRATION_FILE,
+    BCRYPT_MAX_ROUNDS,
+    BCRYPT_MIN_ROUNDS,
+    BCRYPT_REHASH_TOLERANCE,
+    BCRYPT_ROUNDS,
+    BCRYPT_TARGET_MS,
+    HASH_POOL_QUEUE_SIZE,
+    HASH_POOL_WORKERS,
+    SECRET_KEY,
+    TOKEN_CACHE_MAX_ENTRIES,
+)
+from utils.metrics import metrics
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_pwd_context(rounds: int, tolerance: int = BCRYPT_REHASH_TOLERANCE) -> CryptContext:
+    # New hashes use `rounds`; needs_update only flags hashes outside rounds ± tolerance, so hosts
+    # or boots that settle one round apart don't keep rehashing each other's passwords
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=max(rounds - tolerance, 4),
+        bcrypt__max_rounds=min(rounds + tolerance, 31),
+    )
+
+
+pwd_context = build_pwd_context(BCRYPT_ROUNDS)
+
+password_hash_seconds = metrics.histogram(
+    "password_hash_seconds",
+    "Time spent in bcrypt per operation (verify includes rehash checks).",
+    ["op"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+    quantiles=(0.5, 0.95, 0.99),
+)
+hashing_pool_rejections = metrics.counter(
+    "hashing_pool_rejections_total", "Hashing jobs rejected because the pool and its queue were full."
+)
+
+T = TypeVar("T")
+
+
+class HashingPoolBusy(RuntimeError):
+    """Raised when the hashing pool has no free worker nor queue slot."""
+
+
+class HashingPool:
+    """
+    Dedicated, bounded pool for password hashing.
+
+    bcrypt releases the GIL, so plain threads give real parallelism while keeping
+    the expensive work out of Starlette's shared threadpool. At most
+    `workers + max_queue` jobs are admitted; anything above that is rejected
+    immediately instead of piling up behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_queue: int) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwd-hash")
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if not self._slots.acquire(blocking=False):
+            hashing_pool_rejections.inc()
+            raise HashingPoolBusy("Password hashing pool is saturated")
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Release on completion (not on await) so cancelled requests still count until the job finishes
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+hashing_pool = HashingPool(workers=HASH_POOL_WORKERS, max_queue=HASH_POOL_QUEUE_SIZE)
+
+
+def measure_bcrypt_seconds(rounds: int, samples: int = 3) -> float:
+    """Best-of-`samples` wall time of one bcrypt hash at `rounds` on this machine."""
+    hasher = bcrypt.using(rounds=rounds)
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate_bcrypt_rounds(
+    target_ms: float = BCRYPT_TARGET_MS,
+    *,
+    min_rounds: int = BCRYPT_MIN_ROUNDS,
+    max_rounds: int = BCRYPT_MAX_ROUNDS,
+    measure: Callable[[int], float] = measure_bcrypt_seconds,
+) -> int:
+    """
+    Highest work factor in [min_rounds, max_rounds] whose hash stays within `target_ms`.
+
+    Only `min_rounds` is timed: each extra round doubles the cost, so the rest is
+    extrapolated instead of spending seconds hashing at high cost during startup.
+    """
+    base_ms = measure(min_rounds) * 1000
+    rounds = min_rounds
+    while rounds < max_rounds and base_ms * 2 ** (rounds + 1 - min_rounds) <= target_ms:
+        rounds += 1
+    return rounds
+
+
+def load_calibrated_rounds(
+    path: str | None = BCRYPT_CALIBRATION_FILE,
+    *,
+    calibrate: Callable[[], int] = calibrate_bcrypt_rounds,
+) -> int:
+    """
+    Work factor calibrated once and kept in `path` for later boots and workers.
+
+    The file records the settings it was measured for; changing BCRYPT_TARGET_MS or
+    the round limits re-measures. The first writer wins, so concurrent workers agree.
+    """
+    settings = {"target_ms": BCRYPT_TARGET_MS, "min_rounds": BCRYPT_MIN_ROUNDS, "max_rounds": BCRYPT_MAX_ROUNDS}
+    stored = _read_calibration(path)
+    if stored is not None and stored.get("settings") == settings:
+        return int(stored["rounds"])
+    rounds = calibrate()
+    if not path:
+        return rounds
+    record = json.dumps({"rounds": rounds, "settings": settings})
+    try:
+        if stored is not None:
+            os.remove(path)
+        with open(path, "x", encoding="utf-8") as fh:
+            fh.write(record)
+    except FileExistsError:
+        stored = _read_calibration(path)
+        if stored is not None and stored.get("settings") == settings:
+            return int(stored["rounds"])
+    except OSError:
+        # Read-only deploy dir: fall back to measuring on every boot
+        pass
+    return rounds
+
+
+def _read_calibration(path: str | None) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def configure_password_hashing(rounds: int | None = None, tolerance: int = BCRYPT_REHASH_TOLERANCE) -> int:
+    """
+    Install the bcrypt policy used by hashing and rehash-on-login.
+
+    Without `rounds`, BCRYPT_CALIBRATE=true uses the stored calibration (measuring
+    this host once if there is none); otherwise BCRYPT_ROUNDS is used.
+    """
+    global pwd_context
+    if rounds is None:
+        rounds = load_calibrated_rounds() if BCRYPT_CALIBRATE else BCRYPT_ROUNDS
+    pwd_context = build_pwd_context(rounds, tolerance)
+    return rounds
+
+
+def current_bcrypt_rounds() -> int:
+    return pwd_context.to_dict()["bcrypt__rounds"]
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with password_hash_seconds.time(op="verify"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Verify and, when the stored hash uses another cost/scheme, return its replacement."""
+    with password_hash_seconds.time(op="verify"):
+        return pwd_context.verify_and_update(plain_password, hashed_password)
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    with password_hash_seconds.time(op="hash"):
+        return pwd_context.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return await hashing_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run(hash_password, password)
 
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -26,8 +241,80 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def generate_refresh_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    # 256 random bits need no slow hash; SHA-256 keeps the lookup a single indexed equality
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    LRU cache of verified JWT payloads keyed by the SHA-256 of the raw token.
+
+    Entries live exactly until the token's `exp`, so a cached hit never outlives
+    what `jwt.decode` would have accepted. Only successfully verified tokens are
+    stored; garbage tokens always pay the full validation.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, token: str, payload: Dict[str, Any]) -> None:
+        exp = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (float(exp), dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(max_entries=TOKEN_CACHE_MAX_ENTRIES)
+
+
 def decode_token(token: str) -> Dict[str, Any]:
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError as exc:  # pragma: no cover - logic guarded by FastAPI deps
         raise ValueError("Invalid token") from exc
+    token_cache.put(token, payload)
+    return payload
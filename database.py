@@ -1,30 +1,280 @@
 from __future__ import annotations
 
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-from config import DATABASE_URL, SQL_ECHO
+from config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_URL,
+    DB_CONNECT_TIMEOUT,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQL_ECHO,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+)
+from utils.metrics import Sample, metrics
+from utils.query_stats import instrument_engine
 
 Base = declarative_base()
 
-if DATABASE_URL.startswith("sqlite"):
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+class PoolStats:
+    """Checkout counters and time spent acquiring a pooled connection."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.acquisitions = 0
+        self.acquire_seconds_total = 0.0
+        self.acquire_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record_acquire(self, seconds: float, *, timed_out: bool = False) -> None:
+        with self._lock:
+            self.acquisitions += 1
+            self.acquire_seconds_total += seconds
+            self.acquire_seconds_max = max(self.acquire_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "acquisitions": self.acquisitions,
+                "acquire_seconds_total": self.acquire_seconds_total,
+                "acquire_seconds_max": self.acquire_seconds_max,
+                "timeouts": self.timeouts,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.checkouts = self.acquisitions = self.timeouts = 0
+            self.acquire_seconds_total = self.acquire_seconds_max = 0.0
+
+
+# Per engine, so sync and async totals are exported side by side under an `engine` label
+pool_stats: Dict[str, PoolStats] = {"sync": PoolStats(), "async": PoolStats()}
+
+db_sessions_active = metrics.gauge("db_sessions_active", "Request-scoped DB sessions currently open.", ["engine"])
+db_session_seconds = metrics.histogram(
+    "db_session_seconds",
+    "Lifetime of request-scoped DB sessions (dependency entry to close).",
+    ["engine"],
+)
+
+
+class _TimedAcquireMixin:
+    """Records how long callers block acquiring a connection into `pool_stats[engine_label]`."""
+
+    engine_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_stats[self.engine_label].record_acquire(time.perf_counter() - start, timed_out=timed_out)
+
+
+class InstrumentedQueuePool(_TimedAcquireMixin, QueuePool):
+    engine_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_TimedAcquireMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+    )
+
+
+def _pool_kwargs(url: str, poolclass: type) -> Dict[str, Any]:
+    if _is_memory_sqlite(url):
+        # Every pooled connection would open its own empty database; keep SQLAlchemy's default pool
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers proceed while a writer commits; NORMAL sync is safe under WAL
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    finally:
+        cursor.close()
+
+
+def _instrument(sync_engine: Engine, label: str) -> None:
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _apply_sqlite_pragmas)
+
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        pool_stats[label].record_checkout()
+
+    event.listen(sync_engine, "checkout", _on_checkout)
+    instrument_engine(sync_engine)
+
+
+if IS_SQLITE:
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False},
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
         echo=SQL_ECHO,
+        **_pool_kwargs(DATABASE_URL, InstrumentedQueuePool),
     )
 else:
-    engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"connect_timeout": DB_CONNECT_TIMEOUT},
+        echo=SQL_ECHO,
+        **_pool_kwargs(DATABASE_URL, InstrumentedQueuePool),
+    )
+_instrument(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine is built lazily so the driver (aiosqlite/asyncpg) is only imported when an async endpoint runs
+_async_engine: AsyncEngine | None = None
+_async_session_factory: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        connect_args = {} if IS_SQLITE else {"timeout": DB_CONNECT_TIMEOUT}
+        _async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            echo=SQL_ECHO,
+            connect_args=connect_args,
+            **_pool_kwargs(ASYNC_DATABASE_URL, InstrumentedAsyncQueuePool),
+        )
+        _instrument(_async_engine.sync_engine, "async")
+    return _async_engine
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    global _async_session_factory
+    if _async_session_factory is None:
+        # expire_on_commit=False: attribute access after commit must not trigger implicit (sync) IO
+        _async_session_factory = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _async_session_factory()
+
 
 def get_db_session():
     db = SessionLocal()
+    db_sessions_active.inc(engine="sync")
+    start = time.perf_counter()
     try:
         yield db
     finally:
         db.close()
+        db_sessions_active.dec(engine="sync")
+        db_session_seconds.observe(time.perf_counter() - start, engine="sync")
+
+
+async def get_async_db_session():
+    db_sessions_active.inc(engine="async")
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        db_sessions_active.dec(engine="async")
+        db_session_seconds.observe(time.perf_counter() - start, engine="async")
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_session_factory
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
+
+
+def _pool_status(pool) -> Dict[str, int]:
+    if not isinstance(pool, QueuePool):
+        # Default pools of in-memory SQLite have no size/overflow to report
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool status plus checkout/acquire counters, per engine."""
+    stats: Dict[str, Any] = {"sync": {**_pool_status(engine.pool), **pool_stats["sync"].snapshot()}}
+    if _async_engine is not None:
+        stats["async"] = {**_pool_status(_async_engine.pool), **pool_stats["async"].snapshot()}
+    return stats
+
+
+_POOL_GAUGES = ("size", "checked_in", "checked_out", "overflow")
+_POOL_COUNTERS = {
+    "checkouts": ("db_pool_checkouts_total", "Pooled connections handed out."),
+    "acquisitions": ("db_pool_acquisitions_total", "Connection acquisitions from the pool."),
+    "acquire_seconds_total": ("db_pool_acquire_seconds_total", "Time spent waiting for a pooled connection."),
+    "timeouts": ("db_pool_timeouts_total", "Pool checkouts that hit DB_POOL_TIMEOUT."),
+}
+
+
+def _pool_samples():
+    for name, stats in get_pool_stats().items():
+        labels = {"engine": name}
+        for field in _POOL_GAUGES:
+            if field in stats:
+                yield Sample(f"db_pool_{field}", "gauge", f"Connection pool {field.replace('_', ' ')}.", labels, stats[field])
+        for field, (metric, help_text) in _POOL_COUNTERS.items():
+            yield Sample(metric, "counter", help_text, labels, stats[field])
+
+
+metrics.register_collector(_pool_samples)
 
 
 def create_db_and_tables():
@@ -1,24 +1,74 @@
 import os
+import secrets
+import time
+from contextlib import asynccontextmanager
 
 from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 import config  # noqa: F401 - ensures env is loaded
-from models import User
+from core.principal_cache import Principal
+from core.revocation import revocation_table
+from core.security import HashingPoolBusy, configure_password_hashing
+from database import dispose_async_engine
 from services.admin_auth.router import router as admin_auth_router
-from services.user_auth.dependencies import get_current_active_user
+from services.user_auth.dependencies import get_current_active_principal
 from services.user_auth.router import router as user_auth_router
+from utils.code_purge import code_purger
 from utils.db_maintenance import ensure_database
 from utils.logger import logger
+from utils.mailer import mailer_loop
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from utils.outbox import outbox_worker
+from utils.query_stats import report_repeats, track_request
 from utils.rate_limiter import rate_limiter
 from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Match
+
+http_requests_total = metrics.counter("http_requests_total", "HTTP responses by route template and status.", ["method", "route", "status"])
+http_request_duration_seconds = metrics.histogram(
+    "http_request_duration_seconds",
+    "End-to-end request latency per route template.",
+    ["method", "route"],
+    quantiles=(0.5, 0.95, 0.99),
+)
+http_request_db_queries = metrics.histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50),
+    quantiles=(0.5, 0.95, 0.99),
+)
+http_request_db_seconds = metrics.histogram("http_request_db_seconds", "Time spent in SQL per request.", ["route"])
+rate_limit_rejections_total = metrics.counter("rate_limit_rejections_total", "Requests rejected with 429 by the rate limiter.", ["route"])
 
 logger.info("Platform Masters API booting…")
 ensure_database()
-
-app = FastAPI(title="Platform Masters Auth API")
+logger.info("bcrypt work factor: %s rounds", configure_password_hashing())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.OUTBOX_WORKER_ENABLED:
+        outbox_worker.start()
+    if config.CODE_PURGE_ENABLED:
+        code_purger.start()
+    metrics.start()
+    if config.STATELESS_AUTH:
+        # Serve only with recent revocations loaded; tokens are checked against the DB until then
+        revocation_table.start()
+    yield
+    revocation_table.stop()
+    code_purger.stop()
+    outbox_worker.stop()
+    metrics.stop()
+    mailer_loop.stop()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="Platform Masters Auth API", lifespan=lifespan)
 
 cors_kwargs = dict(
     allow_credentials=False,
@@ -42,10 +92,32 @@ app.include_router(admin_auth_router)
 
 
 @app.get("/protected")
-def read_protected_route(current_user: User = Depends(get_current_active_user)):
+def read_protected_route(current_user: Principal = Depends(get_current_active_principal)):
     return {"message": "Dostęp uzyskany!", "user_email": current_user.email}
 
 
+if config.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics(request: Request):
+        if config.METRICS_TOKEN and not secrets.compare_digest(
+            request.headers.get("authorization", ""), f"Bearer {config.METRICS_TOKEN}"
+        ):
+            return PlainTextResponse("Unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _route_label(request: Request) -> str:
+    # Route templates keep label cardinality bounded; raw paths would grow with every id and scanner probe
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in request.app.router.routes:
+            if candidate.matches(request.scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "<unmatched>"
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     # Zwracamy lakoniczny komunikat zamiast listy brakujących pól, by nie wyciekały szczegóły schematu
@@ -53,11 +125,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     return JSONResponse(status_code=400, content={"detail": "Invalid request payload."})
 
 
+@app.exception_handler(HashingPoolBusy)
+async def hashing_pool_busy_handler(request: Request, exc: HashingPoolBusy):
+    # Fail fast instead of queueing bcrypt work behind a login storm
+    logger.warning("Hashing pool saturated at %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service busy. Please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host if request.client else "unknown"
     key = f"{client_ip}:{request.url.path}"
     if not rate_limiter.check_and_increment(key):
+        rate_limit_rejections_total.inc(route=_route_label(request))
         return StarletteJSONResponse(
             status_code=429,
             content={"detail": "Too many requests. Please slow down."},
@@ -65,6 +149,25 @@ async def rate_limit_middleware(request: Request, call_next):
     return await call_next(request)
 
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    # Registered last, so it wraps the rate limiter and also times 429s
+    start = time.perf_counter()
+    status = 500
+    with track_request(f"{request.method} {request.url.path}") as query_stats:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = _route_label(request)
+            http_request_duration_seconds.observe(time.perf_counter() - start, method=request.method, route=route)
+            http_requests_total.inc(method=request.method, route=route, status=status)
+            http_request_db_queries.observe(query_stats.count, route=route)
+            http_request_db_seconds.observe(query_stats.seconds, route=route)
+            report_repeats(query_stats)
+
+
 if __name__ == "__main__":
     import uvicorn
 
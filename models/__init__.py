@@ -1 +1 @@
-from .models import AdminResetCode, User, UserVerificationCode
+from .models import KYC_GROUP, AdminResetCode, EmailOutbox, RefreshToken, User, UserVerificationCode
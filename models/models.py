@@ -1,9 +1,12 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String, func, text
+from sqlalchemy.orm import deferred
 
 from database import Base
 
+KYC_GROUP = "kyc"
+
 
 class User(Base):
     __tablename__ = "users"
@@ -18,17 +21,31 @@ class User(Base):
     is_verified_account = Column(Boolean, default=False, nullable=False)
     is_banned = Column(Boolean, default=False, nullable=False)
     auth_provider = Column(String(50), default="standard", nullable=False)
-    first_name = Column(String(100), nullable=True)
-    last_name = Column(String(100), nullable=True)
-    bank_account = Column(String(34), nullable=True)
-    billing_address = Column(String(255), nullable=True)
-    pesel = Column(String(20), nullable=True)
-    kyc_submitted_at = Column(DateTime, nullable=True)
-    kyc_verified_at = Column(DateTime, nullable=True)
+    # Bumped whenever issued access tokens must stop working (ban, password reset, flag changes)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+    token_version_changed_at = Column(DateTime, nullable=True, index=True)
+    # KYC/PII is only needed where a full profile is serialized; auth paths never load it
+    first_name = deferred(Column(String(100), nullable=True), group=KYC_GROUP)
+    last_name = deferred(Column(String(100), nullable=True), group=KYC_GROUP)
+    bank_account = deferred(Column(String(34), nullable=True), group=KYC_GROUP)
+    billing_address = deferred(Column(String(255), nullable=True), group=KYC_GROUP)
+    pesel = deferred(Column(String(20), nullable=True), group=KYC_GROUP)
+    kyc_submitted_at = deferred(Column(DateTime, nullable=True), group=KYC_GROUP)
+    kyc_verified_at = deferred(Column(DateTime, nullable=True), group=KYC_GROUP)
 
 
 class AdminResetCode(Base):
     __tablename__ = "admin_reset_codes"
+    __table_args__ = (
+        Index("ix_admin_reset_codes_lookup", "user_id", "code", "used", "expires_at"),
+        Index(
+            "ix_admin_reset_codes_active",
+            "user_id",
+            "code",
+            "expires_at",
+            postgresql_where=text("used IS false"),
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -40,6 +57,16 @@ class AdminResetCode(Base):
 
 class UserVerificationCode(Base):
     __tablename__ = "user_verification_codes"
+    __table_args__ = (
+        Index("ix_user_verification_codes_lookup", "user_id", "code", "used", "expires_at"),
+        Index(
+            "ix_user_verification_codes_active",
+            "user_id",
+            "code",
+            "expires_at",
+            postgresql_where=text("used IS false"),
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -47,3 +74,60 @@ class UserVerificationCode(Base):
     expires_at = Column(DateTime, nullable=False)
     used = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    family_id = Column(String(32), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    __table_args__ = (Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    recipient = Column(String(320), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+
+# Admin listing: partial indexes keep the selective moderation views (banned, pending KYC,
+# unconfirmed) O(page size) under keyset pagination on id; pattern_ops serve prefix search on Postgres.
+Index(
+    "ix_users_banned_id",
+    User.id,
+    sqlite_where=User.is_banned.is_(True),
+    postgresql_where=User.is_banned.is_(True),
+)
+Index(
+    "ix_users_kyc_pending_id",
+    User.id,
+    sqlite_where=User.kyc_submitted_at.is_not(None) & User.kyc_verified_at.is_(None),
+    postgresql_where=User.kyc_submitted_at.is_not(None) & User.kyc_verified_at.is_(None),
+)
+Index(
+    "ix_users_unconfirmed_id",
+    User.id,
+    sqlite_where=User.is_email_confirmed.is_(False),
+    postgresql_where=User.is_email_confirmed.is_(False),
+)
+Index("ix_users_email_pattern", User.email, postgresql_ops={"email": "varchar_pattern_ops"}).ddl_if(
+    dialect="postgresql"
+)
+Index("ix_users_nickname_pattern", User.nickname, postgresql_ops={"nickname": "varchar_pattern_ops"}).ddl_if(
+    dialect="postgresql"
+)
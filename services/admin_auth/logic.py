@@ -1,35 +1,74 @@
 from fastapi import HTTPException, status
+from sqlalchemy import Select, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from datetime import datetime, timedelta, timezone
 import secrets
+from typing import Any, Iterator, Sequence
 
-from core.security import create_access_token, hash_password
+from config import BULK_MODERATION_CHUNK_SIZE
+
+from core.principal_cache import principal_cache
+from core.revocation import revocation_table
+from core.security import create_access_token, hash_password, hash_password_async
 from models import AdminResetCode, User
-from services.admin_auth.schemas import AdminCreate, ConfirmCodePayload, ModerationPayload, NewPasswordPayload, ResetCodePayload
-from services.user_auth.logic import authenticate_user, get_user_by_email, register_user
+from services.admin_auth.schemas import (
+    AdminCreate,
+    BulkModerationPayload,
+    ConfirmCodePayload,
+    ModerationPayload,
+    NewPasswordPayload,
+    ResetCodePayload,
+    UserFilter,
+)
+from services.user_auth.logic import (
+    access_token_claims,
+    authenticate_user,
+    authenticate_user_async,
+    bump_token_version,
+    get_user_by_email,
+    get_user_by_email_async,
+    refresh_user_profile,
+    revoke_user_refresh_tokens,
+    register_user,
+    register_user_async,
+)
 from services.user_auth.schemas import UserCreate
-from utils.mailer import send_reset_email_code_sync
+from utils.outbox import KIND_RESET_CODE, enqueue_email, outbox_worker
 
 
-def register_admin(db: Session, payload: AdminCreate) -> User:
-    user_payload = UserCreate(
+def _admin_user_payload(payload: AdminCreate) -> UserCreate:
+    return UserCreate(
         email=payload.email,
         nickname=f"admin-{payload.email}",
         password=payload.password,
         confirmPassword=payload.password,
     )
+
+
+def register_admin(db: Session, payload: AdminCreate) -> User:
     return register_user(
         db,
-        user_payload,
+        _admin_user_payload(payload),
         is_admin=True,
         email_confirmed=True,
         send_verification=False,
     )
 
 
-def authenticate_admin(db: Session, email: str, password: str) -> User:
-    user = authenticate_user(db, email, password)
+async def register_admin_async(db: Session, payload: AdminCreate) -> User:
+    return await register_user_async(
+        db,
+        _admin_user_payload(payload),
+        is_admin=True,
+        email_confirmed=True,
+        send_verification=False,
+    )
+
+
+def _ensure_admin(user: User) -> User:
     if not user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -38,8 +77,16 @@ def authenticate_admin(db: Session, email: str, password: str) -> User:
     return user
 
 
+def authenticate_admin(db: Session, email: str, password: str) -> User:
+    return _ensure_admin(authenticate_user(db, email, password))
+
+
+async def authenticate_admin_async(db: AsyncSession, email: str, password: str) -> User:
+    return _ensure_admin(await authenticate_user_async(db, email, password))
+
+
 def build_access_token_for_admin(user: User) -> str:
-    return create_access_token({"sub": user.email, "is_admin": True})
+    return create_access_token({**access_token_claims(user), "is_admin": True})
 
 
 def _generate_reset_code(length: int = 6) -> str:
@@ -60,50 +107,105 @@ def create_reset_code(db: Session, payload: ResetCodePayload) -> str:
 
     reset_entry = AdminResetCode(user_id=admin.id, code=code, expires_at=expires_at)
     db.add(reset_entry)
+    enqueue_email(db, KIND_RESET_CODE, payload.email, code=code)
     db.commit()
-    send_reset_email_code_sync(payload.email, code)
+    outbox_worker.wake()
     return code
 
 
-def _get_valid_reset_code(db: Session, email: str, code: str) -> AdminResetCode:
-    admin = get_user_by_email(db, email)
-    if not admin or not admin.is_admin:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin nie istnieje.")
-
-    entry = (
-        db.query(AdminResetCode)
-        .filter(
-            AdminResetCode.user_id == admin.id,
+def _valid_reset_code_query(user_id: int, code: str) -> Select:
+    return (
+        select(AdminResetCode)
+        .where(
+            AdminResetCode.user_id == user_id,
             AdminResetCode.code == code,
             AdminResetCode.used.is_(False),
             AdminResetCode.expires_at > datetime.now(timezone.utc),
         )
         .order_by(AdminResetCode.id.desc())
-        .first()
+        .limit(1)
     )
+
+
+def _ensure_reset_code(entry: AdminResetCode | None) -> AdminResetCode:
     if not entry:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Kod jest nieprawidłowy lub wygasł.")
     return entry
 
 
+def _get_valid_reset_code(db: Session, email: str, code: str) -> tuple[User, AdminResetCode]:
+    admin = get_user_by_email(db, email)
+    if not admin or not admin.is_admin:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin nie istnieje.")
+    return admin, _ensure_reset_code(db.scalar(_valid_reset_code_query(admin.id, code)))
+
+
+async def _get_valid_reset_code_async(db: AsyncSession, email: str, code: str) -> tuple[User, AdminResetCode]:
+    admin = await get_user_by_email_async(db, email)
+    if not admin or not admin.is_admin:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin nie istnieje.")
+    return admin, _ensure_reset_code(await db.scalar(_valid_reset_code_query(admin.id, code)))
+
+
 def confirm_reset_code(db: Session, payload: ConfirmCodePayload) -> None:
     _get_valid_reset_code(db, payload.email, payload.code)
 
 
-def reset_password(db: Session, payload: NewPasswordPayload) -> None:
+async def confirm_reset_code_async(db: AsyncSession, payload: ConfirmCodePayload) -> None:
+    await _get_valid_reset_code_async(db, payload.email, payload.code)
+
+
+def _apply_password_reset(db: Session, admin_id: int, entry_id: int, email: str, hashed_password: str) -> None:
+    """
+    Store the new password for an already validated (admin, code) pair.
+
+    The code is claimed with a conditional UPDATE instead of being looked up
+    again, so a code used or expired meanwhile (e.g. while hashing) still fails.
+    """
+    claimed = db.execute(
+        update(AdminResetCode)
+        .where(
+            AdminResetCode.id == entry_id,
+            AdminResetCode.used.is_(False),
+            AdminResetCode.expires_at > datetime.now(timezone.utc),
+        )
+        .values(used=True)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        db.rollback()
+        _ensure_reset_code(None)
+    db.execute(
+        update(User)
+        .where(User.id == admin_id)
+        .values(hashed_password=hashed_password)
+        .execution_options(synchronize_session=False)
+    )
+    # Sessions opened with the old password must not outlive it
+    revoke_user_refresh_tokens(db, admin_id)
+    token_version = bump_token_version(db, admin_id)
+    db.commit()
+    revocation_table.bump(admin_id, token_version)
+    principal_cache.invalidate(email)
+
+
+def _validate_reset(db: Session, payload: NewPasswordPayload) -> tuple[int, int]:
     if payload.password != payload.confirmPassword:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Hasła nie są takie same.")
+    admin, entry = _get_valid_reset_code(db, payload.email, payload.code)
+    return admin.id, entry.id
 
-    entry = _get_valid_reset_code(db, payload.email, payload.code)
-    admin = get_user_by_email(db, payload.email)
-    if not admin:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Admin nie istnieje.")
 
-    admin.hashed_password = hash_password(payload.password)
-    entry.used = True
-    db.add(admin)
-    db.add(entry)
-    db.commit()
+def reset_password(db: Session, payload: NewPasswordPayload) -> None:
+    admin_id, entry_id = _validate_reset(db, payload)
+    _apply_password_reset(db, admin_id, entry_id, payload.email, hash_password(payload.password))
+
+
+async def reset_password_async(db: Session, payload: NewPasswordPayload) -> None:
+    # Validate the code first so invalid attempts never reach the hashing pool
+    admin_id, entry_id = await run_in_threadpool(_validate_reset, db, payload)
+    hashed = await hash_password_async(payload.password)
+    await run_in_threadpool(_apply_password_reset, db, admin_id, entry_id, payload.email, hashed)
 
 
 def verify_account(db: Session, payload: ModerationPayload) -> User:
@@ -113,8 +215,12 @@ def verify_account(db: Session, payload: ModerationPayload) -> User:
     user.is_verified_account = True
     user.kyc_verified_at = datetime.now(timezone.utc)
     db.add(user)
+    db.flush()
+    token_version = bump_token_version(db, user.id)
     db.commit()
-    db.refresh(user)
+    revocation_table.bump(user.id, token_version)
+    refresh_user_profile(db, user)
+    principal_cache.invalidate(user.email)
     return user
 
 
@@ -127,6 +233,146 @@ def ban_user(db: Session, payload: ModerationPayload, *, ban: bool) -> User:
     if ban:
         user.is_verified_account = False
     db.add(user)
+    db.flush()
+    token_version = bump_token_version(db, user.id)
     db.commit()
-    db.refresh(user)
+    revocation_table.bump(user.id, token_version)
+    refresh_user_profile(db, user)
+    principal_cache.invalidate(user.email)
     return user
+
+
+def _moderation_values(action: str) -> dict[str, Any]:
+    if action == "verify":
+        return {"is_verified_account": True, "kyc_verified_at": datetime.now(timezone.utc)}
+    if action == "ban":
+        return {"is_banned": True, "is_verified_account": False}
+    if action == "unban":
+        return {"is_banned": False}
+    raise ValueError(f"Unknown moderation action: {action}")
+
+
+def user_filter_conditions(user_filter: UserFilter) -> list[Any]:
+    conditions: list[Any] = []
+    if user_filter.is_banned is not None:
+        conditions.append(User.is_banned.is_(user_filter.is_banned))
+    if user_filter.is_verified_account is not None:
+        conditions.append(User.is_verified_account.is_(user_filter.is_verified_account))
+    if user_filter.is_email_confirmed is not None:
+        conditions.append(User.is_email_confirmed.is_(user_filter.is_email_confirmed))
+    if user_filter.kyc_state == "none":
+        conditions.append(User.kyc_submitted_at.is_(None))
+    elif user_filter.kyc_state == "pending":
+        conditions.extend([User.kyc_submitted_at.is_not(None), User.kyc_verified_at.is_(None)])
+    elif user_filter.kyc_state == "verified":
+        conditions.append(User.kyc_verified_at.is_not(None))
+    return conditions
+
+
+def _chunks(ids: Sequence[int], size: int) -> Iterator[Sequence[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
+def _update_chunk(db: Session, ids: Sequence[int], values: dict[str, Any]) -> list[Any]:
+    stmt = (
+        update(User)
+        .where(User.id.in_(ids))
+        .values(
+            **values,
+            token_version=User.token_version + 1,
+            token_version_changed_at=datetime.now(timezone.utc),
+        )
+        .returning(User.id, User.email, User.token_version)
+        .execution_options(synchronize_session=False)
+    )
+    return db.execute(stmt).all()
+
+
+def bulk_moderate(db: Session, payload: BulkModerationPayload, action: str) -> dict[str, Any]:
+    """
+    Apply a moderation action to many users with set-based UPDATEs.
+
+    Ids (or the ids matched by the filter, walked in keyset order) are updated in
+    chunks of BULK_MODERATION_CHUNK_SIZE within a single transaction.
+    """
+    values = _moderation_values(action)
+    updated: list[Any] = []
+    requested: list[int] = []
+    try:
+        if payload.user_ids:
+            requested = sorted(set(payload.user_ids))
+            for chunk in _chunks(requested, BULK_MODERATION_CHUNK_SIZE):
+                updated.extend(_update_chunk(db, chunk, values))
+        else:
+            conditions = user_filter_conditions(payload.filter)
+            last_id = 0
+            while True:
+                chunk = db.scalars(
+                    select(User.id)
+                    .where(*conditions, User.id > last_id)
+                    .order_by(User.id)
+                    .limit(BULK_MODERATION_CHUNK_SIZE)
+                ).all()
+                if not chunk:
+                    break
+                updated.extend(_update_chunk(db, chunk, values))
+                last_id = chunk[-1]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    for row in updated:
+        revocation_table.bump(row.id, row.token_version)
+        principal_cache.invalidate(row.email)
+    updated_ids = {row.id for row in updated}
+    # Every existing row in scope is rewritten, so `matched` == `updated` in both paths
+    return {
+        "action": action,
+        "requested": len(requested) if payload.user_ids else None,
+        "matched": len(updated_ids),
+        "updated": len(updated_ids),
+        "not_found": [user_id for user_id in requested if user_id not in updated_ids],
+    }
+
+
+def _prefix_pattern(query: str) -> str:
+    # Escape LIKE wildcards so the search stays an index-friendly prefix match
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def list_users(
+    db: Session,
+    user_filter: UserFilter,
+    *,
+    after_id: int = 0,
+    limit: int = 50,
+    search: str | None = None,
+) -> dict[str, Any]:
+    """
+    One keyset page of users ordered by id.
+
+    `after_id` is the `next_after_id` of the previous page, so every page is a
+    range scan from that id instead of an OFFSET over everything before it.
+    """
+    stmt = select(
+        User.id,
+        User.email,
+        User.nickname,
+        User.is_active,
+        User.is_email_confirmed,
+        User.is_verified_account,
+        User.is_banned,
+        User.kyc_submitted_at,
+        User.kyc_verified_at,
+    ).where(*user_filter_conditions(user_filter), User.id > after_id)
+    if search:
+        pattern = _prefix_pattern(search.strip())
+        stmt = stmt.where(or_(User.email.like(pattern, escape="\\"), User.nickname.like(pattern, escape="\\")))
+    # One extra row tells whether another page exists without a COUNT
+    rows = db.execute(stmt.order_by(User.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"items": rows, "next_after_id": rows[-1].id if has_more else None}
@@ -1,35 +1,38 @@
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import get_db_session
-from models import User
+from core.principal_cache import Principal
+from database import get_async_db_session, get_db_session
 from services.admin_auth import logic, schemas
 from services.admin_auth.dependencies import get_current_admin
+from services.user_auth.logic import issue_refresh_token_async
 from services.user_auth.schemas import UserRead
 
 router = APIRouter(prefix="/admin/auth", tags=["Admin Auth"])
 
 
 @router.post("/register", response_model=schemas.AdminRead, status_code=status.HTTP_201_CREATED)
-def register_admin(
+async def register_admin(
     payload: schemas.AdminCreate,
     db: Session = Depends(get_db_session),
 ):
-    return logic.register_admin(db, payload)
+    return await logic.register_admin_async(db, payload)
 
 
 @router.post("/login", response_model=schemas.Token)
-def login_admin(
+async def login_admin(
     payload: schemas.AdminLogin,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_db_session),
 ):
-    admin = logic.authenticate_admin(db, payload.email, payload.password)
+    admin = await logic.authenticate_admin_async(db, payload.email, payload.password)
     token = logic.build_access_token_for_admin(admin)
-    return schemas.Token(access_token=token)
+    refresh_token = await issue_refresh_token_async(db, admin)
+    return schemas.Token(access_token=token, refresh_token=refresh_token)
 
 
 @router.get("/me", response_model=schemas.AdminRead)
-def read_me_admin(current_admin: User = Depends(get_current_admin)):
+def read_me_admin(current_admin: Principal = Depends(get_current_admin)):
     return current_admin
 
 
@@ -40,22 +43,43 @@ def request_reset_code(payload: schemas.ResetCodePayload, db: Session = Depends(
 
 
 @router.post("/confirm-code", status_code=status.HTTP_200_OK)
-def confirm_reset_code(payload: schemas.ConfirmCodePayload, db: Session = Depends(get_db_session)):
-    logic.confirm_reset_code(db, payload)
+async def confirm_reset_code(payload: schemas.ConfirmCodePayload, db: AsyncSession = Depends(get_async_db_session)):
+    await logic.confirm_reset_code_async(db, payload)
     return {"message": "Kod jest prawidłowy."}
 
 
 @router.post("/new-password", status_code=status.HTTP_200_OK)
-def set_new_password(payload: schemas.NewPasswordPayload, db: Session = Depends(get_db_session)):
-    logic.reset_password(db, payload)
+async def set_new_password(payload: schemas.NewPasswordPayload, db: Session = Depends(get_db_session)):
+    await logic.reset_password_async(db, payload)
     return {"message": "Hasło zostało zaktualizowane."}
 
 
+@router.get("/users", response_model=schemas.UserPage)
+def list_users(
+    after_id: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=200),
+    q: str | None = Query(default=None, min_length=1, max_length=320),
+    is_banned: bool | None = None,
+    is_verified_account: bool | None = None,
+    is_email_confirmed: bool | None = None,
+    kyc_state: schemas.KycState | None = None,
+    db: Session = Depends(get_db_session),
+    admin: Principal = Depends(get_current_admin),
+):
+    user_filter = schemas.UserFilter(
+        is_banned=is_banned,
+        is_verified_account=is_verified_account,
+        is_email_confirmed=is_email_confirmed,
+        kyc_state=kyc_state,
+    )
+    return logic.list_users(db, user_filter, after_id=after_id, limit=limit, search=q)
+
+
 @router.post("/users/verify", response_model=UserRead)
 def verify_account(
     payload: schemas.ModerationPayload,
     db: Session = Depends(get_db_session),
-    admin: User = Depends(get_current_admin),
+    admin: Principal = Depends(get_current_admin),
 ):
     return logic.verify_account(db, payload)
 
@@ -64,7 +88,7 @@ def verify_account(
 def ban_user(
     payload: schemas.ModerationPayload,
     db: Session = Depends(get_db_session),
-    admin: User = Depends(get_current_admin),
+    admin: Principal = Depends(get_current_admin),
 ):
     return logic.ban_user(db, payload, ban=True)
 
@@ -73,6 +97,33 @@ def ban_user(
 def unban_user(
     payload: schemas.ModerationPayload,
     db: Session = Depends(get_db_session),
-    admin: User = Depends(get_current_admin),
+    admin: Principal = Depends(get_current_admin),
 ):
     return logic.ban_user(db, payload, ban=False)
+
+
+@router.post("/users/bulk/verify", response_model=schemas.BulkModerationResult)
+def bulk_verify_accounts(
+    payload: schemas.BulkModerationPayload,
+    db: Session = Depends(get_db_session),
+    admin: Principal = Depends(get_current_admin),
+):
+    return logic.bulk_moderate(db, payload, "verify")
+
+
+@router.post("/users/bulk/ban", response_model=schemas.BulkModerationResult)
+def bulk_ban_users(
+    payload: schemas.BulkModerationPayload,
+    db: Session = Depends(get_db_session),
+    admin: Principal = Depends(get_current_admin),
+):
+    return logic.bulk_moderate(db, payload, "ban")
+
+
+@router.post("/users/bulk/unban", response_model=schemas.BulkModerationResult)
+def bulk_unban_users(
+    payload: schemas.BulkModerationPayload,
+    db: Session = Depends(get_db_session),
+    admin: Principal = Depends(get_current_admin),
+):
+    return logic.bulk_moderate(db, payload, "unban")
@@ -1,4 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, model_validator
 
 
 class AdminBase(BaseModel):
@@ -27,6 +30,7 @@ class NewPasswordPayload(AdminBase):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: str | None = None
 
 
 class AdminRead(AdminBase):
@@ -39,3 +43,59 @@ class AdminRead(AdminBase):
 
 class ModerationPayload(BaseModel):
     user_id: int = Field(gt=0)
+
+
+KycState = Literal["none", "pending", "verified"]
+
+
+class UserFilter(BaseModel):
+    is_banned: bool | None = None
+    is_verified_account: bool | None = None
+    is_email_confirmed: bool | None = None
+    kyc_state: KycState | None = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self.model_dump().values())
+
+
+class BulkModerationPayload(BaseModel):
+    user_ids: list[int] = Field(default_factory=list, max_length=10000)
+    filter: UserFilter | None = None
+
+    @model_validator(mode="after")
+    def _one_selector(self):
+        # Exactly one selector; an empty filter would silently match every account
+        if bool(self.user_ids) == (self.filter is not None):
+            raise ValueError("Provide either user_ids or filter.")
+        if self.filter is not None and self.filter.is_empty():
+            raise ValueError("Filter must set at least one field.")
+        if any(user_id <= 0 for user_id in self.user_ids):
+            raise ValueError("user_ids must be positive.")
+        return self
+
+
+class BulkModerationResult(BaseModel):
+    action: str
+    # Distinct ids sent in `user_ids`; None for filter requests
+    requested: int | None = None
+    matched: int
+    updated: int
+    not_found: list[int] = []
+
+
+class UserListItem(BaseModel):
+    id: int
+    email: EmailStr
+    nickname: str
+    is_active: bool
+    is_email_confirmed: bool
+    is_verified_account: bool
+    is_banned: bool
+    kyc_submitted_at: datetime | None = None
+    kyc_verified_at: datetime | None = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UserPage(BaseModel):
+    items: list[UserListItem]
+    next_after_id: int | None = None
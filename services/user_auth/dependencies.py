@@ -1,7 +1,11 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from config import STATELESS_AUTH
+from core.principal_cache import Principal, principal_cache
+from core.revocation import revocation_table
 from core.security import decode_token
 from database import get_db_session
 from models import User
@@ -10,7 +14,7 @@ from services.user_auth.logic import get_user_by_email
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_session)) -> User:
+def get_token_payload(token: str) -> dict:
     try:
         payload = decode_token(token)
     except ValueError:
@@ -20,21 +24,91 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    email: str | None = payload.get("sub")
-    if not email:
+    if not payload.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Brak danych użytkownika w tokenie.")
+    return payload
+
+
+def get_token_subject(token: str) -> str:
+    return get_token_payload(token)["sub"]
+
+
+def load_principal(db: Session, email: str) -> Principal | None:
+    principal = principal_cache.get(email)
+    if principal is None:
+        user = get_user_by_email(db, email)
+        if not user:
+            return None
+        principal = principal_cache.put_user(user)
+    return principal
+
 
-    user = get_user_by_email(db, email)
-    if not user:
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_session)) -> User:
+    """Full `User` row including KYC fields, for endpoints that serialize or modify it."""
+    payload = get_token_payload(token)
+    user = get_user_by_email(db, payload["sub"], with_kyc=True)
+    if not user or payload.get("tv", user.token_version) < user.token_version:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Nieprawidłowy token.")
+    principal_cache.put_user(user)
     return user
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+def _is_revoked_in_db(db: Session, user_id: int, token_version: int) -> bool:
+    current = db.scalar(select(User.token_version).where(User.id == user_id))
+    if current is None:
+        return True
+    revocation_table.bump(user_id, current)
+    return token_version < current
+
+
+def resolve_principal(db: Session, token: str) -> Principal | None:
+    """
+    Principal for a bearer token.
+
+    With STATELESS_AUTH the flags come from the token itself and only the
+    in-memory revocation table is consulted; while that table is stale (not
+    loaded yet, or polling keeps failing) the epoch is read from the DB instead.
+    Tokens without the epoch claim (minted before the switch) fall back to the
+    cached DB lookup.
+    """
+    payload = get_token_payload(token)
+    if STATELESS_AUTH and "tv" in payload:
+        if revocation_table.is_fresh():
+            revoked = revocation_table.is_revoked(payload["uid"], payload["tv"])
+        else:
+            revoked = _is_revoked_in_db(db, payload["uid"], payload["tv"])
+        if revoked:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token unieważniony.",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return Principal.from_claims(payload)
+    return load_principal(db, payload["sub"])
+
+
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db_session)) -> Principal:
+    """Snapshot of the caller from the token (stateless mode) or the principal cache."""
+    principal = resolve_principal(db, token)
+    if not principal:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Nieprawidłowy token.")
+    return principal
+
+
+def ensure_active(current_user: User | Principal) -> None:
     if current_user.is_banned:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Konto zostało zablokowane.")
     if not current_user.is_email_confirmed and not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Konto niepotwierdzone.")
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Użytkownik nieaktywny.")
+
+
+def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+    ensure_active(current_user)
     return current_user
+
+
+def get_current_active_principal(principal: Principal = Depends(get_current_principal)) -> Principal:
+    ensure_active(principal)
+    return principal
@@ -1,23 +1,60 @@
+import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Any
 
 from fastapi import HTTPException, status
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import Select, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, undefer_group
+from starlette.concurrency import run_in_threadpool
 
-from core.security import create_access_token, hash_password, verify_password
-from models import User, UserVerificationCode
+from config import REFRESH_TOKEN_EXPIRE_DAYS, STATELESS_AUTH
+from core.principal_cache import Principal, principal_cache
+from core.security import (
+    create_access_token,
+    generate_refresh_token,
+    hash_refresh_token,
+    hash_password,
+    hash_password_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+)
+from models import KYC_GROUP, RefreshToken, User, UserVerificationCode
 from services.user_auth.schemas import KycPayload, UserCreate, VerificationCodePayload
-from utils.mailer import send_verification_email_code_sync
+from utils.logger import logger
+from utils.outbox import KIND_VERIFICATION_CODE, enqueue_email, outbox_worker
 
 
-def get_user_by_email(db: Session, email: str) -> User | None:
-    return db.scalar(select(User).where(User.email == email))
+def _user_by_email_query(email: str, *, with_kyc: bool = False) -> Select:
+    # KYC/PII columns are deferred; only profile endpoints (UserRead) ask for them
+    stmt = select(User).where(User.email == email)
+    return stmt.options(undefer_group(KYC_GROUP)) if with_kyc else stmt
+
+
+def get_user_by_email(db: Session, email: str, *, with_kyc: bool = False) -> User | None:
+    return db.scalar(_user_by_email_query(email, with_kyc=with_kyc))
 
 
 def get_user_by_nickname(db: Session, nickname: str) -> User | None:
     return db.scalar(select(User).where(User.nickname == nickname))
 
 
+async def get_user_by_email_async(db: AsyncSession, email: str, *, with_kyc: bool = False) -> User | None:
+    return await db.scalar(_user_by_email_query(email, with_kyc=with_kyc))
+
+
+def refresh_user_profile(db: Session, user: User) -> User:
+    """Reload `user` after a commit including the deferred KYC group, in one SELECT."""
+    db.execute(
+        select(User)
+        .where(User.id == user.id)
+        .options(undefer_group(KYC_GROUP))
+        .execution_options(populate_existing=True)
+    )
+    return user
+
+
 def _generate_verification_code(length: int = 6) -> str:
     alphabet = "0123456789"
     from secrets import choice
@@ -25,17 +62,51 @@ def _generate_verification_code(length: int = 6) -> str:
     return "".join(choice(alphabet) for _ in range(length))
 
 
-def _create_verification_code(db: Session, user: User) -> str:
-    db.query(UserVerificationCode).filter(UserVerificationCode.user_id == user.id).delete(synchronize_session=False)
+def _stage_verification_code(db: Session, user_id: int, email: str) -> str:
     code = _generate_verification_code()
     expires_at = datetime.now(timezone.utc) + timedelta(minutes=15)
-    entry = UserVerificationCode(user_id=user.id, code=code, expires_at=expires_at)
-    db.add(entry)
+    db.add(UserVerificationCode(user_id=user_id, code=code, expires_at=expires_at))
+    # Email is staged in the same transaction as the code and delivered by the outbox worker
+    enqueue_email(db, KIND_VERIFICATION_CODE, email, code=code)
+    return code
+
+
+def _create_verification_code(db: Session, user: User) -> str:
+    db.query(UserVerificationCode).filter(UserVerificationCode.user_id == user.id).delete(synchronize_session=False)
+    code = _stage_verification_code(db, user.id, user.email)
     db.commit()
-    send_verification_email_code_sync(user.email, code)
+    outbox_worker.wake()
     return code
 
 
+def _duplicate_user_detail(db: Session, exc: IntegrityError, payload: UserCreate) -> str:
+    message = str(exc.orig)
+    # SQLite names the column ("users.email"), Postgres the unique index ("ix_users_email")
+    if "users.email" in message or '"ix_users_email"' in message:
+        return "Email już zarejestrowany."
+    if "users.nickname" in message or '"ix_users_nickname"' in message:
+        return "Nick zajęty."
+    if get_user_by_email(db, payload.email):
+        return "Email już zarejestrowany."
+    return "Nick zajęty."
+
+
+def ensure_user_available(db: Session, payload: UserCreate) -> None:
+    """
+    Cheap pre-check that the email and nickname are free.
+
+    Runs before bcrypt so replayed or duplicate signups never take a hashing-pool
+    slot; the unique indexes behind the INSERT remain the real guard against races.
+    """
+    taken = db.execute(
+        select(User.email, User.nickname).where(or_(User.email == payload.email, User.nickname == payload.nickname)).limit(2)
+    ).all()
+    if any(row.email == payload.email for row in taken):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email już zarejestrowany.")
+    if taken:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nick zajęty.")
+
+
 def register_user(
     db: Session,
     payload: UserCreate,
@@ -43,73 +114,274 @@ def register_user(
     is_admin: bool = False,
     email_confirmed: bool | None = None,
     send_verification: bool = True,
+    hashed_password: str | None = None,
 ) -> User:
-    if get_user_by_email(db, payload.email):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email już zarejestrowany.")
-    if get_user_by_nickname(db, payload.nickname):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nick zajęty.")
+    """
+    Create the user (and its verification code) in a single transaction.
+
+    The INSERT is optimistic: uniqueness is left to the email/nickname indexes and
+    a violation is mapped back to the matching 400, so a signup costs one INSERT
+    ... RETURNING plus the code/outbox inserts and one COMMIT.
+    """
     if payload.password != payload.confirmPassword:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Hasła nie są takie same.")
 
-    user = User(
-        nickname=payload.nickname,
-        email=payload.email,
-        hashed_password=hash_password(payload.password),
+    is_email_confirmed = email_confirmed if email_confirmed is not None else False
+    try:
+        user = db.scalar(
+            insert(User)
+            .values(
+                nickname=payload.nickname,
+                email=payload.email,
+                hashed_password=hashed_password or hash_password(payload.password),
+                is_admin=is_admin,
+                is_email_confirmed=is_email_confirmed,
+            )
+            .returning(User)
+            .options(undefer_group(KYC_GROUP))
+        )
+        if send_verification and not is_email_confirmed:
+            _stage_verification_code(db, user.id, user.email)
+        # RETURNING (with the deferred KYC group undeferred) loaded every column; detach so the
+        # commit does not expire them into a re-SELECT
+        db.expunge(user)
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=_duplicate_user_detail(db, exc, payload)
+        ) from exc
+    if send_verification and not is_email_confirmed:
+        outbox_worker.wake()
+    return user
+
+
+async def register_user_async(
+    db: Session,
+    payload: UserCreate,
+    *,
+    is_admin: bool = False,
+    email_confirmed: bool | None = None,
+    send_verification: bool = True,
+) -> User:
+    """
+    Same as `register_user`, but bcrypt runs on the dedicated hashing pool and the
+    DB work in the threadpool, so the event loop never blocks on either.
+    """
+    if payload.password != payload.confirmPassword:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Hasła nie są takie same.")
+    await run_in_threadpool(ensure_user_available, db, payload)
+    hashed = await hash_password_async(payload.password)
+    return await run_in_threadpool(
+        register_user,
+        db,
+        payload,
         is_admin=is_admin,
-        is_email_confirmed=email_confirmed if email_confirmed is not None else False,
+        email_confirmed=email_confirmed,
+        send_verification=send_verification,
+        hashed_password=hashed,
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    if send_verification and not user.is_email_confirmed:
-        _create_verification_code(db, user)
-    return user
 
 
-def authenticate_user(db: Session, email: str, password: str) -> User:
-    user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Nieprawidłowy email lub hasło.",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def _invalid_credentials() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Nieprawidłowy email lub hasło.",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def ensure_login_allowed(user: User) -> None:
     if user.is_banned:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Konto zostało zablokowane.")
     if not user.is_email_confirmed and not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Konto niepotwierdzone. Sprawdź email.")
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Konto jest nieaktywne.")
+
+
+def authenticate_user(db: Session, email: str, password: str) -> User:
+    user = get_user_by_email(db, email)
+    if not user:
+        raise _invalid_credentials()
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        raise _invalid_credentials()
+    ensure_login_allowed(user)
+    if new_hash:
+        # Stored hash predates the current bcrypt cost; swap it while we know the password
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
 
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> User:
+    user = await get_user_by_email_async(db, email)
+    if not user:
+        raise _invalid_credentials()
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        raise _invalid_credentials()
+    ensure_login_allowed(user)
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
+
+def access_token_claims(user: User) -> dict[str, Any]:
+    claims: dict[str, Any] = {"sub": user.email, "is_admin": user.is_admin}
+    if STATELESS_AUTH:
+        # Everything the auth dependencies check, so they can skip the DB entirely
+        claims.update(Principal.from_user(user).to_claims(user.token_version))
+    return claims
+
+
 def build_access_token_for_user(user: User) -> str:
-    return create_access_token({"sub": user.email, "is_admin": user.is_admin})
+    return create_access_token(access_token_claims(user))
 
 
-def confirm_email(db: Session, payload: VerificationCodePayload) -> None:
-    user = get_user_by_email(db, payload.email)
-    if not user:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Użytkownik nie istnieje.")
-    entry = (
-        db.query(UserVerificationCode)
-        .filter(
-            UserVerificationCode.user_id == user.id,
-            UserVerificationCode.code == payload.code,
+def bump_token_version(db: Session, user_id: int) -> int:
+    """
+    Stage a new token epoch for a user and return it.
+
+    Call `revocation_table.bump` with the result after committing; other workers
+    pick the change up from `token_version_changed_at`.
+    """
+    return db.scalar(
+        update(User)
+        .where(User.id == user_id)
+        .values(token_version=User.token_version + 1, token_version_changed_at=datetime.now(timezone.utc))
+        .returning(User.token_version)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _invalid_refresh_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Nieprawidłowy token odświeżania.",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _stage_refresh_token(db: Session | AsyncSession, user_id: int, family_id: str | None = None) -> str:
+    token = generate_refresh_token()
+    db.add(
+        RefreshToken(
+            user_id=user_id,
+            family_id=family_id or uuid.uuid4().hex,
+            token_hash=hash_refresh_token(token),
+            expires_at=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+    )
+    return token
+
+
+def _revoke_refresh_tokens_stmt(*conditions: Any):
+    return (
+        update(RefreshToken)
+        .where(*conditions, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def revoke_user_refresh_tokens(db: Session, user_id: int) -> None:
+    """Stage revocation of every live refresh token of a user (caller commits)."""
+    db.execute(_revoke_refresh_tokens_stmt(RefreshToken.user_id == user_id))
+
+
+async def issue_refresh_token_async(db: AsyncSession, user: User) -> str:
+    """Start a new token family at login."""
+    token = _stage_refresh_token(db, user.id)
+    await db.commit()
+    return token
+
+
+async def rotate_refresh_token_async(db: AsyncSession, raw_token: str) -> tuple[User, str]:
+    """
+    Exchange a refresh token for its successor in the same family.
+
+    A token can be exchanged once: the claim is a conditional UPDATE, so two
+    concurrent uses cannot both win. Presenting an already used token means it
+    leaked, and the whole family is revoked.
+    """
+    now = datetime.now(timezone.utc)
+    row = (
+        await db.execute(
+            select(RefreshToken, User)
+            .join(User, User.id == RefreshToken.user_id)
+            .where(RefreshToken.token_hash == hash_refresh_token(raw_token), RefreshToken.expires_at > now)
+        )
+    ).first()
+    if row is None or row.RefreshToken.revoked_at is not None:
+        raise _invalid_refresh_token()
+    token, user = row
+
+    claimed = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token.id, RefreshToken.used_at.is_(None), RefreshToken.revoked_at.is_(None))
+        .values(used_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if claimed.rowcount != 1:
+        await db.execute(_revoke_refresh_tokens_stmt(RefreshToken.family_id == token.family_id))
+        await db.commit()
+        logger.warning("Refresh token reuse for user %s, family %s revoked", user.id, token.family_id)
+        raise _invalid_refresh_token()
+    try:
+        ensure_login_allowed(user)
+    except HTTPException:
+        await db.execute(_revoke_refresh_tokens_stmt(RefreshToken.family_id == token.family_id))
+        await db.commit()
+        raise
+    successor = _stage_refresh_token(db, user.id, token.family_id)
+    await db.commit()
+    return user, successor
+
+
+def _valid_verification_code_query(user_id: int, code: str) -> Select:
+    return (
+        select(UserVerificationCode)
+        .where(
+            UserVerificationCode.user_id == user_id,
+            UserVerificationCode.code == code,
             UserVerificationCode.used.is_(False),
             UserVerificationCode.expires_at > datetime.now(timezone.utc),
         )
         .order_by(UserVerificationCode.id.desc())
-        .first()
+        .limit(1)
     )
+
+
+def _mark_email_confirmed(user: User, entry: UserVerificationCode | None) -> None:
     if not entry:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Kod jest nieprawidłowy lub wygasł.")
-
     entry.used = True
     user.is_email_confirmed = True
+
+
+def confirm_email(db: Session, payload: VerificationCodePayload) -> None:
+    user = get_user_by_email(db, payload.email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Użytkownik nie istnieje.")
+    entry = db.scalar(_valid_verification_code_query(user.id, payload.code))
+    _mark_email_confirmed(user, entry)
     db.add(entry)
     db.add(user)
     db.commit()
+    principal_cache.invalidate(payload.email)
+
+
+async def confirm_email_async(db: AsyncSession, payload: VerificationCodePayload) -> None:
+    user = await get_user_by_email_async(db, payload.email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Użytkownik nie istnieje.")
+    entry = await db.scalar(_valid_verification_code_query(user.id, payload.code))
+    _mark_email_confirmed(user, entry)
+    await db.commit()
+    principal_cache.invalidate(payload.email)
 
 
 def resend_verification_code(db: Session, email: str) -> None:
@@ -132,5 +404,6 @@ def submit_kyc(db: Session, user: User, payload: KycPayload) -> User:
     user.kyc_submitted_at = datetime.now(timezone.utc)
     db.add(user)
     db.commit()
-    db.refresh(user)
+    refresh_user_profile(db, user)
+    principal_cache.invalidate(user.email)
     return user
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import get_db_session
+from database import get_async_db_session, get_db_session
 from models import User
 from services.user_auth import logic, schemas
 from services.user_auth.dependencies import get_current_active_user
@@ -10,22 +11,32 @@ router = APIRouter(prefix="/auth", tags=["User Auth"])
 
 
 @router.post("/register", response_model=schemas.RegistrationResponse, status_code=status.HTTP_201_CREATED)
-def register_user(
+async def register_user(
     payload: schemas.UserCreate,
     db: Session = Depends(get_db_session),
 ):
-    logic.register_user(db, payload)
+    await logic.register_user_async(db, payload)
     return {"message": "Kod weryfikacyjny został wysłany na podany email."}
 
 
 @router.post("/login", response_model=schemas.Token)
-def login_user(
+async def login_user(
     payload: schemas.UserLogin,
-    db: Session = Depends(get_db_session),
+    db: AsyncSession = Depends(get_async_db_session),
 ):
-    user = logic.authenticate_user(db, payload.email, payload.password)
+    user = await logic.authenticate_user_async(db, payload.email, payload.password)
     token = logic.build_access_token_for_user(user)
-    return schemas.Token(access_token=token)
+    refresh_token = await logic.issue_refresh_token_async(db, user)
+    return schemas.Token(access_token=token, refresh_token=refresh_token)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(
+    payload: schemas.RefreshPayload,
+    db: AsyncSession = Depends(get_async_db_session),
+):
+    user, refresh_token = await logic.rotate_refresh_token_async(db, payload.refresh_token)
+    return schemas.Token(access_token=logic.build_access_token_for_user(user), refresh_token=refresh_token)
 
 
 @router.get("/me", response_model=schemas.UserRead)
@@ -34,8 +45,8 @@ def read_me(current_user: User = Depends(get_current_active_user)):
 
 
 @router.post("/verify-code", status_code=status.HTTP_200_OK)
-def confirm_email(payload: schemas.VerificationCodePayload, db: Session = Depends(get_db_session)):
-    logic.confirm_email(db, payload)
+async def confirm_email(payload: schemas.VerificationCodePayload, db: AsyncSession = Depends(get_async_db_session)):
+    await logic.confirm_email_async(db, payload)
     return {"message": "Konto potwierdzone. Możesz się zalogować."}
 
 
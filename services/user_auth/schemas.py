@@ -20,6 +20,11 @@ class UserLogin(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: str | None = None
+
+
+class RefreshPayload(BaseModel):
+    refresh_token: str = Field(min_length=1, max_length=256)
 
 
 class UserRead(UserBase):
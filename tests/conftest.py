@@ -1,5 +1,6 @@
 import os
 import sys
+from contextlib import contextmanager
 from importlib import reload
 from pathlib import Path
 from typing import Generator
@@ -24,6 +25,10 @@ os.environ.setdefault("RESET_DB", "1")
 os.environ.setdefault("LOG_LEVEL", "WARNING")
 os.environ.setdefault("RATE_LIMIT_REQUESTS", "100")
 os.environ.setdefault("RATE_LIMIT_WINDOW_SECONDS", "60")
+os.environ.setdefault("OUTBOX_WORKER_ENABLED", "false")
+os.environ.setdefault("CODE_PURGE_ENABLED", "false")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("METRICS_ENABLED", "true")
 
 # Wyłącz ostrzeżenia datetime z bibliotek zewnętrznych używanych przez jose
 warnings.filterwarnings("ignore", category=DeprecationWarning, module="jose.jwt")
@@ -32,8 +37,12 @@ pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning:jose.jwt")
 import config  # noqa: E402
 import database  # noqa: E402
 import main  # noqa: E402
+from core.principal_cache import principal_cache  # noqa: E402
+from core.revocation import revocation_table  # noqa: E402
 from database import Base, SessionLocal, engine  # noqa: E402
+from models import User  # noqa: E402
 from utils.db_maintenance import ensure_database  # noqa: E402
+from utils.query_stats import capture_queries  # noqa: E402
 from utils.rate_limiter import rate_limiter  # noqa: E402
 
 
@@ -81,12 +90,50 @@ def _reset_rate_limiter():
     rate_limiter.reset(max_requests=int(os.environ.get("RATE_LIMIT_REQUESTS", "100")), window_seconds=int(os.environ.get("RATE_LIMIT_WINDOW_SECONDS", "60")))
 
 
+@pytest.fixture(autouse=True)
+def _reset_principal_cache():
+    # Schemat jest resetowany per test, więc id/emaile się powtarzają
+    principal_cache.clear()
+    revocation_table.clear()
+
+
 @pytest.fixture
 def no_email(monkeypatch):
     # Stub wysyłki maili, aby testy nie robiły realnych połączeń SMTP
     monkeypatch.setattr("utils.mailer.send_reset_email_code", lambda *a, **k: None)
     monkeypatch.setattr("utils.mailer.send_reset_email_code_sync", lambda *a, **k: None)
-    monkeypatch.setattr("services.admin_auth.logic.send_reset_email_code_sync", lambda *a, **k: None)
     monkeypatch.setattr("utils.mailer.send_verification_email_code", lambda *a, **k: None)
     monkeypatch.setattr("utils.mailer.send_verification_email_code_sync", lambda *a, **k: None)
-    monkeypatch.setattr("services.user_auth.logic.send_verification_email_code_sync", lambda *a, **k: None)
+
+
+@pytest.fixture
+def max_queries():
+    # Użycie: `with max_queries(5): client.post(...)` – liczy wszystkie zapytania SQL w bloku
+    @contextmanager
+    def _assert_max_queries(limit: int):
+        with capture_queries() as stats:
+            yield stats
+        listing = "\n".join(f"{count}x {sql}" for sql, count in stats.statements.items())
+        assert stats.count <= limit, f"{stats.count} queries (limit {limit}):\n{listing}"
+
+    return _assert_max_queries
+
+
+@pytest.fixture
+def admin_headers(client):
+    # Zarejestrowany i zalogowany admin – nagłówek Authorization do endpointów /admin
+    client.post("/admin/auth/register", json={"email": "test-admin@skill2win.gg", "password": "AdminPass123!"})
+    login = client.post("/admin/auth/login", json={"email": "test-admin@skill2win.gg", "password": "AdminPass123!"})
+    return {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+@pytest.fixture
+def seed_users(db_session):
+    # Użycie: `ids = seed_users("banned", 7, is_banned=True)` – nicki/emaile `<prefix><i>`, zwraca id w kolejności
+    def _seed(prefix: str, count: int, **flags) -> list[int]:
+        users = [User(nickname=f"{prefix}{i}", email=f"{prefix}{i}@skill2win.gg", hashed_password="x", **flags) for i in range(count)]
+        db_session.add_all(users)
+        db_session.commit()
+        return [u.id for u in users]
+
+    return _seed
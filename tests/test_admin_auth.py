@@ -90,3 +90,25 @@ def test_reset_code_single_entry(client, db_session, no_email):
     admin = db_session.query(User).filter_by(email="once@skill2win.gg").first()
     codes = db_session.query(AdminResetCode).filter_by(user_id=admin.id).all()
     assert len(codes) == 1
+
+
+def test_reset_code_used_while_hashing_is_rejected(client, db_session, no_email, monkeypatch):
+    from core import security
+
+    client.post("/admin/auth/register", json={"email": "race@skill2win.gg", "password": "OldPass123!"})
+    client.post("/admin/auth/reset-code", json={"email": "race@skill2win.gg"})
+    code_entry = db_session.query(AdminResetCode).order_by(AdminResetCode.id.desc()).first()
+
+    async def hash_after_concurrent_reset(password):
+        # Another request consumes the code between validation and the password write
+        db_session.query(AdminResetCode).filter_by(id=code_entry.id).update({"used": True})
+        return security.hash_password(password)
+
+    monkeypatch.setattr("services.admin_auth.logic.hash_password_async", hash_after_concurrent_reset)
+    resp = client.post(
+        "/admin/auth/new-password",
+        json={"email": "race@skill2win.gg", "code": code_entry.code, "password": "NewPass456!", "confirmPassword": "NewPass456!"},
+    )
+    assert resp.status_code == 400
+    resp = client.post("/admin/auth/login", json={"email": "race@skill2win.gg", "password": "OldPass123!"})
+    _assert_token(resp)
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from config import BULK_MODERATION_CHUNK_SIZE
+from models import User
+
+
+def test_bulk_ban_by_ids_reports_missing(client, db_session, admin_headers, seed_users):
+    ids = seed_users("bulk", BULK_MODERATION_CHUNK_SIZE + 5, is_email_confirmed=True, is_verified_account=True)
+    resp = client.post("/admin/auth/users/bulk/ban", headers=admin_headers, json={"user_ids": ids + [999999, ids[0]]})
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "action": "ban",
+        "requested": len(ids) + 1,
+        "matched": len(ids),
+        "updated": len(ids),
+        "not_found": [999999],
+    }
+    db_session.expire_all()
+    assert db_session.query(User).filter(User.is_banned.is_(True)).count() == len(ids)
+    assert db_session.query(User).filter(User.id.in_(ids), User.is_verified_account.is_(True)).count() == 0
+
+    resp = client.post("/admin/auth/users/bulk/unban", headers=admin_headers, json={"user_ids": ids[:3]})
+    assert resp.json()["updated"] == 3
+
+
+def test_bulk_verify_by_kyc_filter(client, db_session, admin_headers, seed_users):
+    pending = seed_users("bulk", 3, is_email_confirmed=True, kyc_submitted_at=datetime.now(timezone.utc))
+    other = User(nickname="nokyc", email="nokyc@skill2win.gg", hashed_password="x")
+    db_session.add(other)
+    db_session.commit()
+
+    resp = client.post("/admin/auth/users/bulk/verify", headers=admin_headers, json={"filter": {"kyc_state": "pending"}})
+    assert resp.status_code == 200
+    assert resp.json() == {"action": "verify", "requested": None, "matched": 3, "updated": 3, "not_found": []}
+    db_session.expire_all()
+    verified = {u.id for u in db_session.query(User).filter(User.kyc_verified_at.is_not(None))}
+    assert verified == set(pending)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [{}, {"filter": {}}, {"user_ids": [1], "filter": {"is_banned": False}}, {"user_ids": [0]}],
+)
+def test_bulk_payload_requires_single_selector(client, admin_headers, body):
+    resp = client.post("/admin/auth/users/bulk/ban", headers=admin_headers, json=body)
+    assert resp.status_code == 400
+
+
+def test_bulk_requires_admin(client):
+    resp = client.post("/admin/auth/users/bulk/ban", json={"user_ids": [1]})
+    assert resp.status_code == 401
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import select, text
+
+from models import User
+
+
+def test_keyset_pages_cover_filtered_users_once(client, admin_headers, seed_users):
+    banned = seed_users("banned", 7, is_banned=True)
+    seed_users("clean", 4)
+
+    seen, after_id = [], 0
+    while True:
+        resp = client.get(
+            "/admin/auth/users", headers=admin_headers, params={"is_banned": True, "limit": 3, "after_id": after_id}
+        )
+        assert resp.status_code == 200
+        page = resp.json()
+        seen.extend(item["id"] for item in page["items"])
+        if page["next_after_id"] is None:
+            break
+        after_id = page["next_after_id"]
+    assert seen == banned
+    assert "pesel" not in page["items"][0]
+
+
+def test_prefix_search_and_kyc_filter(client, admin_headers, seed_users):
+    seed_users("alpha", 2, kyc_submitted_at=datetime.now(timezone.utc))
+    seed_users("beta", 2, kyc_submitted_at=datetime.now(timezone.utc))
+    seed_users("al_x", 1)
+
+    resp = client.get("/admin/auth/users", headers=admin_headers, params={"q": "alp", "kyc_state": "pending"})
+    assert [item["nickname"] for item in resp.json()["items"]] == ["alpha0", "alpha1"]
+    # LIKE wildcards in the query are literal
+    resp = client.get("/admin/auth/users", headers=admin_headers, params={"q": "al_"})
+    assert [item["nickname"] for item in resp.json()["items"]] == ["al_x0"]
+
+
+def test_listing_requires_admin(client):
+    assert client.get("/admin/auth/users").status_code == 401
+
+
+def test_banned_page_uses_partial_index(db_session):
+    stmt = select(User.id).where(User.is_banned.is_(True), User.id > 0).order_by(User.id).limit(50)
+    compiled = stmt.compile(dialect=db_session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    plan = " ".join(str(row[-1]) for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    assert "ix_users_banned_id" in plan
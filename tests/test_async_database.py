@@ -0,0 +1,31 @@
+import asyncio
+
+import config
+import database
+from models import User
+from services.user_auth.logic import get_user_by_email_async
+
+
+def test_async_url_mapping(monkeypatch):
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    assert config._resolve_async_database_url("sqlite:///./dev.db") == "sqlite+aiosqlite:///./dev.db"
+    assert (
+        config._resolve_async_database_url("postgresql+psycopg2://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+    )
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "postgresql+asyncpg://override/db")
+    assert config._resolve_async_database_url("sqlite:///x.db") == "postgresql+asyncpg://override/db"
+
+
+def test_async_session_sees_sync_writes(db_session):
+    db_session.add(User(nickname="both", email="both@skill2win.gg", hashed_password="x"))
+    db_session.commit()
+
+    async def scenario():
+        try:
+            async with database.AsyncSessionLocal() as session:
+                user = await get_user_by_email_async(session, "both@skill2win.gg")
+                return user.nickname if user else None
+        finally:
+            await database.dispose_async_engine()
+
+    assert asyncio.run(scenario()) == "both"
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import text
+
+from services.admin_auth.logic import _valid_reset_code_query
+from services.user_auth.logic import _valid_verification_code_query
+
+
+def _query_plan(db_session, stmt) -> str:
+    compiled = stmt.compile(dialect=db_session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    return " ".join(str(row[-1]) for row in db_session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+
+@pytest.mark.parametrize(
+    "build_query, index_name",
+    [
+        (_valid_verification_code_query, "ix_user_verification_codes_lookup"),
+        (_valid_reset_code_query, "ix_admin_reset_codes_lookup"),
+    ],
+)
+def test_code_lookup_uses_composite_index(db_session, build_query, index_name):
+    plan = _query_plan(db_session, build_query(1, "123456"))
+    assert f"USING INDEX {index_name}" in plan
+    # All four predicates are resolved in the index search, not filtered row by row
+    assert "used=" in plan and "expires_at>" in plan
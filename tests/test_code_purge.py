@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+from models import AdminResetCode, EmailOutbox, RefreshToken, User, UserVerificationCode
+from utils import code_purge, outbox
+
+
+def _seed(db_session):
+    user = User(nickname="purge", email="purge@skill2win.gg", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(7):
+        rows.append(UserVerificationCode(user_id=user.id, code=f"e{i}", expires_at=now - timedelta(minutes=1)))
+    rows.append(UserVerificationCode(user_id=user.id, code="used", expires_at=now + timedelta(hours=1), used=True))
+    rows.append(UserVerificationCode(user_id=user.id, code="live", expires_at=now + timedelta(hours=1)))
+    rows.append(AdminResetCode(user_id=user.id, code="old", expires_at=now - timedelta(minutes=1)))
+    rows.append(AdminResetCode(user_id=user.id, code="fresh", expires_at=now + timedelta(hours=1)))
+    db_session.add_all(rows)
+    db_session.commit()
+
+
+def test_purge_removes_only_dead_codes_in_batches(db_session):
+    _seed(db_session)
+    report = code_purge.purge_codes(batch_size=3, time_budget=60)
+    assert report == {
+        "deleted": {"user_verification_codes": 8, "admin_reset_codes": 1, "email_outbox": 0, "refresh_tokens": 0},
+        "batches": 6,
+        "complete": True,
+    }
+    db_session.expire_all()
+    assert [c.code for c in db_session.query(UserVerificationCode)] == ["live"]
+    assert [c.code for c in db_session.query(AdminResetCode)] == ["fresh"]
+
+
+def test_purge_drops_finished_outbox_rows_after_retention(db_session, monkeypatch):
+    monkeypatch.setattr(code_purge, "OUTBOX_RETENTION_DAYS", 7)
+    now = datetime.now(timezone.utc)
+    old, recent = now - timedelta(days=8), now - timedelta(days=1)
+    for status, created_at in (
+        (outbox.STATUS_SENT, old),
+        (outbox.STATUS_DEAD, old),
+        (outbox.STATUS_PENDING, old),
+        (outbox.STATUS_SENT, recent),
+    ):
+        db_session.add(
+            EmailOutbox(kind="reset_code", recipient=f"{status}@skill2win.gg", status=status, next_attempt_at=now, created_at=created_at)
+        )
+    db_session.commit()
+
+    assert code_purge.purge_codes(time_budget=60)["deleted"]["email_outbox"] == 2
+    db_session.expire_all()
+    remaining = sorted((e.status, e.created_at.date()) for e in db_session.query(EmailOutbox))
+    assert remaining == [(outbox.STATUS_PENDING, old.date()), (outbox.STATUS_SENT, recent.date())]
+
+
+def test_purge_drops_stale_refresh_tokens(db_session, monkeypatch):
+    monkeypatch.setattr(code_purge, "REFRESH_TOKEN_REUSE_WINDOW_DAYS", 7)
+    user = User(nickname="tokens", email="tokens@skill2win.gg", hashed_password="x")
+    db_session.add(user)
+    db_session.commit()
+    now = datetime.now(timezone.utc)
+    later, old, recent = now + timedelta(days=20), now - timedelta(days=8), now - timedelta(days=1)
+    tokens = {
+        "expired": dict(expires_at=now - timedelta(minutes=1)),
+        "used-old": dict(expires_at=later, used_at=old),
+        "revoked-old": dict(expires_at=later, revoked_at=old),
+        # still inside the reuse-detection window
+        "used-recent": dict(expires_at=later, used_at=recent),
+        "revoked-recent": dict(expires_at=later, revoked_at=recent),
+        "live": dict(expires_at=later),
+    }
+    for name, fields in tokens.items():
+        db_session.add(RefreshToken(user_id=user.id, family_id="f", token_hash=name, **fields))
+    db_session.commit()
+
+    assert code_purge.purge_codes(time_budget=60)["deleted"]["refresh_tokens"] == 3
+    db_session.expire_all()
+    assert sorted(t.token_hash for t in db_session.query(RefreshToken)) == ["live", "revoked-recent", "used-recent"]
+
+
+def test_exhausted_budget_reports_incomplete(db_session):
+    _seed(db_session)
+    report = code_purge.purge_codes(batch_size=3, time_budget=0)
+    assert report["complete"] is False
+    assert report["batches"] == 0
+
+
+def test_cli_prints_counts(db_session, capsys):
+    _seed(db_session)
+    assert code_purge.main(["--batch-size", "100"]) == 0
+    out = capsys.readouterr().out
+    assert "user_verification_codes: 8 deleted" in out
+    assert "admin_reset_codes: 1 deleted" in out
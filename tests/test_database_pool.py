@@ -0,0 +1,57 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+import database
+
+
+def test_sqlite_pragmas_applied():
+    with database.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == database.SQLITE_BUSY_TIMEOUT_MS
+
+
+def test_pool_stats_track_checkouts():
+    database.pool_stats["sync"].reset()
+    with database.engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        stats = database.get_pool_stats()
+        assert stats["sync"]["checked_out"] >= 1
+    stats = database.get_pool_stats()["sync"]
+    assert stats["checkouts"] >= 1
+    assert stats["acquisitions"] >= 1
+    assert stats["timeouts"] == 0
+    assert isinstance(database.engine.pool, database.InstrumentedQueuePool)
+
+
+def test_async_pool_is_counted_under_its_own_label():
+    async def scenario():
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+
+    database.pool_stats["async"].reset()
+    asyncio.run(scenario())
+    stats = database.get_pool_stats()["async"]
+    assert isinstance(database.get_async_engine().pool, database.InstrumentedAsyncQueuePool)
+    assert stats["checkouts"] >= 1 and stats["acquisitions"] >= 1
+    asyncio.run(database.dispose_async_engine())
+
+
+def test_memory_sqlite_keeps_one_database_across_connections():
+    # A QueuePool would hand each connection its own empty in-memory database
+    script = (
+        "import database; from sqlalchemy import text\n"
+        "with database.engine.begin() as conn: conn.execute(text('CREATE TABLE t (x INTEGER)'))\n"
+        "with database.engine.connect() as conn: print(conn.execute(text('SELECT count(*) FROM t')).scalar())\n"
+        "print(type(database.engine.pool).__name__)\n"
+    )
+    env = {**os.environ, "DATABASE_URL": "sqlite://"}
+    result = subprocess.run([sys.executable, "-c", script], cwd=Path(database.__file__).parent, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    count, poolclass = result.stdout.split()
+    assert count == "0" and poolclass != "InstrumentedQueuePool"
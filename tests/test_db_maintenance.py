@@ -0,0 +1,52 @@
+import threading
+import time
+
+from alembic.script import ScriptDirectory
+
+from utils import db_maintenance
+
+
+def test_script_head_matches_alembic():
+    expected = ScriptDirectory.from_config(db_maintenance._alembic_config()).get_current_head()
+    assert db_maintenance.script_head() == expected
+
+
+def test_database_at_head_skips_alembic(monkeypatch):
+    monkeypatch.setenv("DB_MAINTENANCE", "update")
+    monkeypatch.setenv("RESET_DB", "0")
+    monkeypatch.setattr(db_maintenance, "current_revision", lambda: db_maintenance.script_head())
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Alembic must not run when the schema is at head")
+
+    monkeypatch.setattr(db_maintenance, "_upgrade_schema", fail)
+    monkeypatch.setattr(db_maintenance, "migration_lock", fail)
+    db_maintenance.ensure_database()
+
+
+def test_concurrent_boots_migrate_once(monkeypatch):
+    monkeypatch.setenv("DB_MAINTENANCE", "update")
+    monkeypatch.setenv("RESET_DB", "0")
+    state = {"revision": "0001_initial", "runs": 0, "active": 0, "max_active": 0}
+    lock = threading.Lock()
+
+    def fake_upgrade(cfg):
+        with lock:
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+        time.sleep(0.05)
+        with lock:
+            state["active"] -= 1
+            state["runs"] += 1
+            state["revision"] = db_maintenance.script_head()
+
+    monkeypatch.setattr(db_maintenance, "current_revision", lambda: state["revision"])
+    monkeypatch.setattr(db_maintenance, "_upgrade_schema", fake_upgrade)
+
+    workers = [threading.Thread(target=db_maintenance.ensure_database) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert state["runs"] == 1
+    assert state["max_active"] == 1
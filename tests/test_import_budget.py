@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+from benchmarks.import_time import ROOT, measure_once
+
+# Generous default for shared CI runners; tighten locally with IMPORT_BUDGET_SECONDS
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+
+
+def test_import_main_within_budget():
+    wall, packages = measure_once()
+    slowest = sorted(packages.items(), key=lambda kv: -kv[1])[:5]
+    assert wall <= IMPORT_BUDGET_SECONDS, f"import main took {wall:.2f}s; slowest: {slowest}"
+
+
+def test_heavy_dependencies_stay_lazy(tmp_path):
+    probe = "import sys, main; print(','.join(m for m in ('alembic', 'aiosmtplib', 'jinja2') if m in sys.modules))"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'lazy.db'}", "DB_MAINTENANCE": "skip", "RESET_DB": "0"}
+    proc = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == ""
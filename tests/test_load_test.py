@@ -0,0 +1,33 @@
+from benchmarks.load_test import SCENARIOS, SETUP_STEPS, StepStats, compare, load_collection, percentile
+
+
+def test_collection_steps_are_parameterised_per_virtual_user():
+    steps = load_collection()
+    for name in {*SETUP_STEPS, *(step for _, names in SCENARIOS.values() for step in names)}:
+        assert name in steps, name
+
+    path, headers, body = steps["Admin Verify User"].render({"admin_token": "t0k", "user_id": 7})
+    assert path == "/admin/auth/users/verify"
+    assert headers["Authorization"] == "Bearer t0k"
+    assert body == b'{ "user_id": 7 }'
+
+    _, _, body = steps["User Register"].render({"user_email": "a@skill2win.gg", "user_nickname": "vu1"})
+    assert b'"email": "a@skill2win.gg"' in body and b'"nickname": "vu1"' in body
+    assert b"player" not in body
+
+
+def test_step_summary_and_baseline_comparison():
+    assert percentile([0.1, 0.2, 0.3, 0.4], 0.5) == 0.2
+    stats = StepStats()
+    for ms in range(1, 101):
+        stats.record(ms / 1000, "200", True)
+    stats.record(0.5, "500", False)
+    summary = stats.summary(elapsed=10)
+    assert summary["requests"] == 101 and summary["errors"] == 1 and summary["rps"] == 10.1
+    assert summary["p50_ms"] == 51.0 and summary["max_ms"] == 500.0
+    assert summary["statuses"] == {"200": 100, "500": 1}
+
+    meta = {"target": "asgi", "users": 1}
+    baseline = {"meta": meta, "steps": {"User Login": {"p95_ms": 100.0, "rps": 10.0}, "User Me": {"p95_ms": 10.0, "rps": 50.0}}}
+    current = {"meta": meta, "steps": {"User Login": {"p95_ms": 130.0, "rps": 8.0}, "User Me": {"p95_ms": 10.5, "rps": 50.0}}}
+    assert compare(current, baseline, max_regression=20) == ["User Login"]
@@ -0,0 +1,62 @@
+import io
+import json
+import logging
+import queue
+from logging.handlers import QueueListener
+
+from utils.logger import BoundedQueueHandler, JsonFormatter, SamplingFilter, _parse_sample_rates
+
+
+def _logger(name, handler):
+    log = logging.getLogger(name)
+    log.handlers = [handler]
+    log.propagate = False
+    log.setLevel(logging.DEBUG)
+    return log
+
+
+def test_records_are_written_on_listener_thread_as_json():
+    stream = io.StringIO()
+    sink = logging.StreamHandler(stream)
+    sink.setFormatter(JsonFormatter())
+    handler = BoundedQueueHandler(queue.Queue(maxsize=100))
+    listener = QueueListener(handler.queue, sink)
+    listener.start()
+    try:
+        args = ["before"]
+        _logger("test.json", handler).warning("value=%s", args, extra={"request_id": "r1"})
+        args[0] = "after"  # the message is frozen when logged
+    finally:
+        listener.stop()
+    entry = json.loads(stream.getvalue())
+    assert entry["msg"] == "value=['before']"
+    assert entry["level"] == "WARNING" and entry["request_id"] == "r1"
+
+
+def test_full_queue_drops_and_counts():
+    handler = BoundedQueueHandler(queue.Queue(maxsize=2), policy="drop")
+    log = _logger("test.drop", handler)
+    for i in range(5):
+        log.info("record %s", i)
+    assert (handler.enqueued, handler.dropped) == (2, 3)
+
+    blocking = BoundedQueueHandler(queue.Queue(maxsize=1), policy="block", block_seconds=0.01)
+    log = _logger("test.block", blocking)
+    log.info("fits")
+    log.info("times out")
+    assert (blocking.enqueued, blocking.dropped) == (1, 1)
+
+
+def test_sampling_by_level():
+    rates = _parse_sample_rates("DEBUG=0, info=1")
+    assert rates == {logging.DEBUG: 0.0, logging.INFO: 1.0}
+    sampler = SamplingFilter(rates)
+    handler = BoundedQueueHandler(queue.Queue(maxsize=100))
+    handler.addFilter(sampler)
+    log = _logger("test.sample", handler)
+    for _ in range(10):
+        log.debug("noise")
+    log.info("kept")
+    log.error("kept")
+    assert sampler.sampled_out == 10
+    assert handler.enqueued == 2
@@ -0,0 +1,125 @@
+import asyncio
+import socket
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+from utils import mailer  # noqa: E402
+from utils.mailer import SMTPConnectionPool, build_email_message  # noqa: E402
+
+
+class SinkHandler:
+    def __init__(self) -> None:
+        self.sessions = 0
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("refused"):
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.content)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    handler = SinkHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        yield handler, controller
+    finally:
+        controller.stop()
+
+
+def _pool(controller, **kwargs) -> SMTPConnectionPool:
+    return SMTPConnectionPool(hostname=controller.hostname, port=controller.port, start_tls=False, **kwargs)
+
+
+def _message(i: int):
+    return build_email_message(f"Test {i}", f"user{i}@skill2win.gg", "body", "verification_code.html", {"verification_code": "123456"})
+
+
+def test_pool_reuses_one_session(smtp_sink):
+    handler, controller = smtp_sink
+    pool = _pool(controller, size=1)
+
+    async def scenario():
+        for i in range(5):
+            await pool.send(_message(i))
+        await pool.send_messages([_message(i) for i in range(5, 10)])
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert len(handler.messages) == 10
+    assert handler.sessions == 1
+    assert pool.stats["connects"] == 1
+    assert pool.stats["reuses"] == 5
+
+
+def test_pool_replaces_dropped_session(smtp_sink):
+    handler, controller = smtp_sink
+    pool = _pool(controller, noop_after=0)
+
+    async def scenario():
+        await pool.send(_message(0))
+        # simulate the server silently dropping the idle session
+        smtp, _ = pool._idle[0]
+        smtp.close()
+        pool._idle[0] = (smtp, 0.0)
+        await pool.send(_message(1))
+        await pool.close()
+
+    asyncio.run(scenario())
+    assert len(handler.messages) == 2
+    assert pool.stats["connects"] == 2
+
+
+def test_batch_reports_failures_per_message(smtp_sink):
+    handler, controller = smtp_sink
+    pool = _pool(controller)
+    refused = build_email_message("Test", "refused@skill2win.gg", "body", "verification_code.html", {"verification_code": "1"})
+
+    async def scenario():
+        outcomes = await pool.send_messages([_message(0), refused, _message(2)], return_exceptions=True)
+        await pool.close()
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+    assert outcomes[0] is None and outcomes[2] is None
+    assert isinstance(outcomes[1], Exception)
+    assert len(handler.messages) == 2
+    assert handler.sessions == 1
+
+
+def test_sync_helpers_share_one_loop_and_session(smtp_sink, monkeypatch):
+    handler, controller = smtp_sink
+    pool = _pool(controller)
+    monkeypatch.setattr(mailer, "smtp_pool", pool)
+    try:
+        mailer.send_verification_email_code_sync("a@skill2win.gg", "111111")
+        mailer.send_reset_email_code_sync("b@skill2win.gg", "222222")
+        future = mailer.send_verification_email_code_sync("c@skill2win.gg", "333333", wait=False)
+        future.result(timeout=10)
+        # async callers on another loop are routed onto the mailer loop too
+        asyncio.run(mailer.send_reset_email_code("d@skill2win.gg", "444444"))
+    finally:
+        mailer.mailer_loop.submit(pool.close()).result(timeout=10)
+    assert len(handler.messages) == 4
+    assert handler.sessions == 1
+    assert pool.stats["connects"] == 1
@@ -0,0 +1,107 @@
+import json
+import math
+import os
+import subprocess
+import sys
+
+from utils.metrics import MetricsRegistry, Sample, estimate_quantile, metrics
+from utils.rate_limiter import rate_limiter
+
+
+def _dead_pid() -> int:
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def test_histogram_buckets_and_quantile_estimates():
+    registry = MetricsRegistry()
+    hist = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=(0.1, 0.2, 0.4), quantiles=(0.5, 0.99))
+    for value in (0.05, 0.15, 0.15, 0.3, 1.0):
+        hist.observe(value, route="/a")
+    assert hist.count(route="/a") == 5
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{route="/a",le="0.2"} 3' in text
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 5' in text
+    assert 'latency_seconds_count{route="/a"} 5' in text
+    assert 'latency_seconds_quantile{route="/a",quantile="0.5"} 0.175' in text
+    # Above the last finite bound the estimate is clamped to it
+    assert 'latency_seconds_quantile{route="/a",quantile="0.99"} 0.4' in text
+    assert math.isnan(estimate_quantile(0.5, (0.1,), [0, 0]))
+
+
+def test_render_escapes_labels_and_includes_collectors():
+    registry = MetricsRegistry()
+    registry.counter("events_total", "Events.", ["kind"]).inc(2, kind='a"b\\c')
+    registry.register_collector(lambda: [Sample("queue_depth", "gauge", "Depth.", {}, 7)])
+    text = registry.render()
+    assert "# TYPE events_total counter" in text
+    assert 'events_total{kind="a\\"b\\\\c"} 2.0' in text
+    assert "# TYPE queue_depth gauge\nqueue_depth 7.0" in text
+
+
+def test_workers_are_summed_through_the_metrics_dir(tmp_path):
+    registry = MetricsRegistry(directory=tmp_path)
+    registry.counter("requests_total", "Requests.").inc(3)
+    registry.gauge("in_flight", "In flight.").set(1)
+    registry.histogram("work_seconds", "Work.", buckets=(1.0,)).observe(0.5)
+
+    def other_worker(pid):
+        return {
+            "requests_total": {"kind": "counter", "help": "Requests.", "labelnames": [], "series": [[[], 4.0]]},
+            "in_flight": {"kind": "gauge", "help": "In flight.", "labelnames": [], "series": [[[], 5.0]]},
+            "work_seconds": {
+                "kind": "histogram",
+                "help": "Work.",
+                "labelnames": [],
+                "buckets": [1.0],
+                "quantiles": [],
+                "series": [[[], {"counts": [0, 2], "sum": 6.0}]],
+            },
+        }
+
+    live, dead = os.getppid(), _dead_pid()
+    for pid in (live, dead):
+        (tmp_path / f"metrics-{pid}.json").write_text(json.dumps(other_worker(pid)))
+
+    merged = registry.collect()
+    # Counters and histograms keep exited workers' totals; gauges only count live processes
+    assert merged["requests_total"]["series"][()] == 11.0
+    assert merged["in_flight"]["series"][()] == 6.0
+    assert merged["work_seconds"]["series"][()] == {"counts": [1, 4], "sum": 12.5}
+
+    registry.render()
+    assert (tmp_path / f"metrics-{os.getpid()}.json").exists()
+
+
+def test_metrics_endpoint_reports_routes_hashing_and_limiter(client, no_email):
+    metrics.reset()
+    client.post("/admin/auth/register", json={"email": "admin@skill2win.gg", "password": "AdminPass123!"})
+    assert client.post("/admin/auth/login", json={"email": "admin@skill2win.gg", "password": "AdminPass123!"}).status_code == 200
+
+    rate_limiter.reset(max_requests=1)
+    client.get("/protected")
+    assert client.get("/protected").status_code == 429
+    rate_limiter.reset(max_requests=100)
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert 'http_requests_total{method="POST",route="/admin/auth/login",status="200"} 1.0' in text
+    assert 'http_request_duration_seconds_quantile{method="POST",route="/admin/auth/login",quantile="0.95"}' in text
+    assert 'password_hash_seconds_count{op="hash"} 1' in text
+    assert 'password_hash_seconds_count{op="verify"} 1' in text
+    assert 'rate_limit_rejections_total{route="/protected"} 1.0' in text
+    assert 'http_requests_total{method="GET",route="/protected",status="429"} 1.0' in text
+    assert 'db_pool_checked_out{engine="sync"}' in text
+    assert "log_records_dropped_total" in text
+
+
+def test_metrics_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr("config.METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+from models import EmailOutbox, UserVerificationCode
+from utils import outbox
+from utils.outbox import OutboxWorker
+
+
+def _register(client, email="outbox@skill2win.gg"):
+    resp = client.post(
+        "/auth/register",
+        json={"email": email, "nickname": email.split("@")[0], "password": "Pass12345", "confirmPassword": "Pass12345"},
+    )
+    assert resp.status_code == 201
+
+
+def _make_due(db_session):
+    db_session.query(EmailOutbox).update({"next_attempt_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db_session.commit()
+
+
+def test_register_stages_email_with_code(client, db_session):
+    _register(client)
+    code = db_session.query(UserVerificationCode).one()
+    entry = db_session.query(EmailOutbox).one()
+    assert entry.kind == outbox.KIND_VERIFICATION_CODE
+    assert entry.recipient == "outbox@skill2win.gg"
+    assert entry.payload == {"code": code.code}
+    assert entry.status == outbox.STATUS_PENDING
+
+
+def test_worker_delivers_pending_messages(client, db_session, monkeypatch):
+    batches = []
+
+    async def fake_send(messages):
+        batches.append([msg["To"] for msg in messages])
+        return [None] * len(messages)
+
+    monkeypatch.setattr("utils.mailer.send_messages", fake_send)
+    _register(client)
+    _register(client, "second@skill2win.gg")
+
+    counts = OutboxWorker(batch_size=10).run_once()
+    assert counts == {"claimed": 2, "sent": 2, "retried": 0, "dead": 0}
+    # one pooled SMTP session carries the whole batch
+    assert len(batches) == 1 and set(batches[0]) == {"outbox@skill2win.gg", "second@skill2win.gg"}
+    db_session.expire_all()
+    assert {e.status for e in db_session.query(EmailOutbox)} == {outbox.STATUS_SENT}
+    # delivered rows no longer carry the plaintext code
+    assert all(e.payload == {} for e in db_session.query(EmailOutbox))
+    # nothing left to claim
+    assert OutboxWorker().run_once()["claimed"] == 0
+
+
+def test_failed_delivery_backs_off_then_dead_letters(client, db_session, monkeypatch):
+    async def broken(messages):
+        raise ConnectionError("smtp down")
+
+    monkeypatch.setattr("utils.mailer.send_messages", broken)
+    _register(client)
+    worker = OutboxWorker(max_attempts=2, backoff_seconds=60)
+
+    assert worker.run_once() == {"claimed": 1, "sent": 0, "retried": 1, "dead": 0}
+    db_session.expire_all()
+    entry = db_session.query(EmailOutbox).one()
+    assert entry.last_error == "smtp down"
+    assert entry.attempts == 1
+    # backoff keeps it out of the next poll
+    assert worker.run_once()["claimed"] == 0
+
+    _make_due(db_session)
+    assert worker.run_once()["dead"] == 1
+    db_session.expire_all()
+    dead = db_session.query(EmailOutbox).one()
+    assert dead.status == outbox.STATUS_DEAD and dead.payload == {}
+
+
+def test_batch_past_the_lease_is_cancelled(client, db_session, monkeypatch):
+    import asyncio
+    import threading
+
+    cancelled = threading.Event()
+
+    async def hanging(messages):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return [None] * len(messages)
+
+    monkeypatch.setattr("utils.mailer.send_messages", hanging)
+    _register(client)
+
+    counts = OutboxWorker(lease_seconds=0.2).run_once()
+    assert counts == {"claimed": 1, "sent": 0, "retried": 0, "dead": 0}
+    # the late batch must not keep sending once its rows can be claimed again
+    assert cancelled.wait(5)
+    db_session.expire_all()
+    assert db_session.query(EmailOutbox).one().status == outbox.STATUS_PENDING
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from core import security
+from core.security import HashingPool, HashingPoolBusy, hash_password_async, verify_password_async
+
+
+def test_async_hash_and_verify_roundtrip():
+    async def scenario():
+        hashed = await hash_password_async("Pass12345")
+        return await verify_password_async("Pass12345", hashed), await verify_password_async("Wrong123", hashed)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_pool_rejects_when_saturated():
+    pool = HashingPool(workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0)
+        with pytest.raises(HashingPoolBusy):
+            await pool.run(lambda: None)
+        release.set()
+        await blocker
+        # slot is returned once the job finishes
+        assert await pool.run(lambda: 42) == 42
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_login_returns_503_when_hashing_pool_busy(client, monkeypatch):
+    async def busy(*args, **kwargs):
+        raise HashingPoolBusy("busy")
+
+    monkeypatch.setattr(security.hashing_pool, "run", busy)
+    resp = client.post("/auth/login", json={"email": "storm@skill2win.gg", "password": "Pass12345"})
+    # unknown user short-circuits before hashing
+    assert resp.status_code == 401
+
+    resp = client.post("/admin/auth/register", json={"email": "storm@skill2win.gg", "password": "Pass12345!"})
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+
+
+def test_calibration_picks_highest_cost_within_target():
+    # 10 ms at 10 rounds doubles per round: 14 -> 160 ms fits 250 ms, 15 -> 320 ms does not
+    assert security.calibrate_bcrypt_rounds(250, min_rounds=10, max_rounds=15, measure=lambda rounds: 0.01) == 14
+    assert security.calibrate_bcrypt_rounds(1, min_rounds=10, max_rounds=15, measure=lambda rounds: 0.01) == 10
+    assert security.calibrate_bcrypt_rounds(10**6, min_rounds=10, max_rounds=12, measure=lambda rounds: 0.01) == 12
+
+
+def test_calibration_is_stored_and_reused(tmp_path):
+    path = str(tmp_path / "bcrypt.json")
+    runs = []
+
+    def calibrate():
+        runs.append(1)
+        return 11 + len(runs)
+
+    assert security.load_calibrated_rounds(path, calibrate=calibrate) == 12
+    # later boots (and other workers) reuse the stored value instead of re-measuring
+    assert security.load_calibrated_rounds(path, calibrate=calibrate) == 12
+    assert len(runs) == 1
+
+    with open(path) as fh:
+        stored = json.load(fh)
+    stored["settings"]["target_ms"] = -1
+    with open(path, "w") as fh:
+        json.dump(stored, fh)
+    # a different target invalidates the stored result
+    assert security.load_calibrated_rounds(path, calibrate=calibrate) == 13
+
+
+def test_costs_within_tolerance_are_not_rehashed():
+    context = security.build_pwd_context(5, tolerance=1)
+    assert not context.needs_update(security.build_pwd_context(4, tolerance=0).hash("x"))
+    assert not context.needs_update(security.build_pwd_context(6, tolerance=0).hash("x"))
+    assert context.needs_update(security.build_pwd_context(7, tolerance=0).hash("x"))
+    assert context.hash("x").startswith("$2b$05$")
+
+
+@pytest.mark.parametrize("new_rounds", [6, 4])
+def test_login_rehashes_to_current_cost(client, db_session, new_rounds):
+    from models import User
+
+    original = security.current_bcrypt_rounds()
+    security.configure_password_hashing(10 - new_rounds)
+    try:
+        client.post("/admin/auth/register", json={"email": "rehash@skill2win.gg", "password": "AdminPass123!"})
+        # two rounds apart: outside the ±1 tolerance band
+        security.configure_password_hashing(new_rounds)
+        resp = client.post("/admin/auth/login", json={"email": "rehash@skill2win.gg", "password": "AdminPass123!"})
+        assert resp.status_code == 200
+        db_session.expire_all()
+        stored = db_session.query(User).filter_by(email="rehash@skill2win.gg").one().hashed_password
+        assert stored.startswith(f"$2b${new_rounds:02d}$")
+        assert security.verify_password("AdminPass123!", stored)
+    finally:
+        security.configure_password_hashing(original)
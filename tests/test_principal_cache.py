@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from core.principal_cache import Principal, PrincipalCache, principal_cache
+from models import User, UserVerificationCode
+
+
+def _principal(email: str) -> Principal:
+    return Principal.from_user(
+        SimpleNamespace(
+            id=1,
+            email=email,
+            nickname="nick",
+            is_active=True,
+            is_admin=False,
+            is_email_confirmed=True,
+            is_verified_account=False,
+            is_banned=False,
+            auth_provider="standard",
+        )
+    )
+
+
+def test_lru_eviction_and_counters():
+    cache = PrincipalCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", _principal("a"))
+    cache.put("b", _principal("b"))
+    assert cache.get("a") is not None  # a becomes most recent
+    cache.put("c", _principal("c"))
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 2, "hits": 1, "misses": 1, "evictions": 1}
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = PrincipalCache(max_entries=10, ttl_seconds=5)
+    clock = [100.0]
+    monkeypatch.setattr("core.principal_cache.time.monotonic", lambda: clock[0])
+    cache.put("a", _principal("a"))
+    clock[0] += 6
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_ban_invalidates_cached_principal(client, db_session, no_email):
+    client.post("/admin/auth/register", json={"email": "mod@skill2win.gg", "password": "AdminPass123!"})
+    admin_token = client.post(
+        "/admin/auth/login", json={"email": "mod@skill2win.gg", "password": "AdminPass123!"}
+    ).json()["access_token"]
+    client.post(
+        "/auth/register",
+        json={"email": "cached@skill2win.gg", "nickname": "cached", "password": "Pass12345", "confirmPassword": "Pass12345"},
+    )
+    code_entry = db_session.query(UserVerificationCode).order_by(UserVerificationCode.id.desc()).first()
+    client.post("/auth/verify-code", json={"email": "cached@skill2win.gg", "code": code_entry.code})
+    token = client.post("/auth/login", json={"email": "cached@skill2win.gg", "password": "Pass12345"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/protected", headers=headers).status_code == 200
+    hits = principal_cache.stats()["hits"]
+    assert client.get("/protected", headers=headers).status_code == 200
+    assert principal_cache.stats()["hits"] == hits + 1
+
+    user_id = db_session.query(User).filter_by(email="cached@skill2win.gg").first().id
+    resp = client.post("/admin/auth/users/ban", headers={"Authorization": f"Bearer {admin_token}"}, json={"user_id": user_id})
+    assert resp.status_code == 200
+    assert client.get("/protected", headers=headers).status_code == 403
@@ -0,0 +1,88 @@
+import logging
+
+from sqlalchemy import text
+
+import main
+from database import engine
+from models import AdminResetCode, UserVerificationCode
+from utils import query_stats
+from utils.metrics import metrics
+from utils.query_stats import capture_queries, normalize_sql, report_repeats, track_request
+
+
+def test_normalize_sql_collapses_literals_and_in_lists():
+    assert normalize_sql("SELECT *\n  FROM users WHERE id IN (?, ?, ?) AND email = 'a''b' LIMIT 10") == (
+        "SELECT * FROM users WHERE id IN (...) AND email = ? LIMIT ?"
+    )
+    assert normalize_sql("SELECT anon_1 FROM t WHERE a = %(email_1)s AND b::text = $1") == (
+        "SELECT anon_1 FROM t WHERE a = ? AND b::text = ?"
+    )
+
+
+def test_statements_are_attributed_to_the_current_request(caplog):
+    with track_request("GET /loop") as stats:
+        with engine.connect() as conn:
+            for value in range(3):
+                conn.execute(text("SELECT :v"), {"v": value})
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # outside the request: not attributed
+
+    assert stats.count == 3 and stats.seconds > 0
+    assert stats.repeated(3) == [("SELECT ?", 3)]
+    with caplog.at_level(logging.WARNING, logger="platform-masters"):
+        report_repeats(stats, threshold=3)
+    assert "Statement repeated 3x in GET /loop (possible N+1): SELECT ?" in caplog.text
+
+
+def test_slow_queries_are_logged_normalized(monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "SQL_SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="platform-masters"):
+        with track_request("POST /slow"), engine.connect() as conn:
+            conn.execute(text("SELECT 42 WHERE 'x' = :p"), {"p": "x"})
+    assert "in POST /slow: SELECT ? WHERE ? = ?" in caplog.text
+
+
+def test_failed_statements_do_not_leak_timers():
+    with capture_queries() as stats, engine.connect() as conn:
+        try:
+            conn.execute(text("SELECT * FROM missing_table"))
+        except Exception:
+            conn.rollback()
+        conn.execute(text("SELECT 1"))
+        assert not conn.info.get(query_stats._START_KEY)
+    assert stats.statements.get("SELECT ?") == 1
+
+
+def test_endpoint_query_budgets(client, db_session, no_email, max_queries):
+    # Availability pre-check (keeps duplicates off the hashing pool), then user, code and outbox INSERTs
+    with max_queries(4):
+        client.post(
+            "/auth/register",
+            json={"email": "budget@skill2win.gg", "nickname": "budget", "password": "Pass12345", "confirmPassword": "Pass12345"},
+        )
+    code = db_session.query(UserVerificationCode).first().code
+    with max_queries(4):
+        assert client.post("/auth/verify-code", json={"email": "budget@skill2win.gg", "code": code}).status_code == 200
+    with max_queries(2):
+        assert client.post("/auth/login", json={"email": "budget@skill2win.gg", "password": "Pass12345"}).status_code == 200
+
+    client.post("/admin/auth/register", json={"email": "admin@skill2win.gg", "password": "OldPass123!"})
+    client.post("/admin/auth/reset-code", json={"email": "admin@skill2win.gg"})
+    code = db_session.query(AdminResetCode).first().code
+    # Admin + code lookup before hashing; afterwards the code is claimed by a conditional UPDATE, then three writes
+    with max_queries(6):
+        resp = client.post(
+            "/admin/auth/new-password",
+            json={"email": "admin@skill2win.gg", "code": code, "password": "NewPass456!", "confirmPassword": "NewPass456!"},
+        )
+    assert resp.status_code == 200
+
+
+def test_request_query_counts_reach_metrics(client, no_email):
+    metrics.reset()
+    client.post("/admin/auth/register", json={"email": "admin@skill2win.gg", "password": "AdminPass123!"})
+    client.post("/admin/auth/login", json={"email": "admin@skill2win.gg", "password": "AdminPass123!"})
+    series = metrics.collect()["http_request_db_queries"]["series"][("/admin/auth/login",)]
+    # One user lookup plus the refresh token insert, counted through the threadpool/async boundary
+    assert sum(series["counts"]) == 1 and series["sum"] == 2
+    assert main.http_request_db_seconds.count(route="/admin/auth/login") == 1
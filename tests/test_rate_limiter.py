@@ -0,0 +1,97 @@
+import logging
+import multiprocessing
+import os
+
+from utils import rate_limiter as rate_limiter_module
+from utils.rate_limiter import InMemoryRateLimiter, RateLimiter, SharedMemoryStore
+
+
+def _clock(monkeypatch, start: float = 1000.0):
+    now = [start]
+    monkeypatch.setattr(rate_limiter_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_steady_rate(monkeypatch):
+    now = _clock(monkeypatch)
+    limiter = InMemoryRateLimiter(max_requests=3, window_seconds=60, sweep_interval=0)
+    assert all(limiter.check_and_increment("ip:/a") for _ in range(3))
+    assert not limiter.check_and_increment("ip:/a")
+    # one request frees up every window / max_requests seconds
+    now[0] += 20
+    assert limiter.check_and_increment("ip:/a")
+    assert not limiter.check_and_increment("ip:/a")
+    # other keys are independent
+    assert limiter.check_and_increment("ip:/b")
+
+
+def test_sweep_drops_idle_keys(monkeypatch):
+    now = _clock(monkeypatch)
+    limiter = InMemoryRateLimiter(max_requests=10, window_seconds=10, sweep_interval=0)
+    for i in range(50):
+        limiter.check_and_increment(f"scanner-{i}:/404")
+    limiter.check_and_increment("busy:/login")
+    assert len(limiter) == 51
+    now[0] += 1.5
+    limiter.check_and_increment("busy:/login")
+    assert limiter.sweep() == 50
+    assert len(limiter) == 1
+
+
+def test_key_table_is_bounded(monkeypatch):
+    _clock(monkeypatch)
+    limiter = InMemoryRateLimiter(max_requests=5, window_seconds=60, max_keys=100, sweep_interval=0)
+    for i in range(1000):
+        limiter.check_and_increment(f"10.0.{i}:/x")
+    assert len(limiter) == 100
+
+
+def test_full_burst_allowed_despite_float_rounding(monkeypatch):
+    _clock(monkeypatch)
+    limiter = InMemoryRateLimiter(max_requests=7, window_seconds=60, sweep_interval=0)
+    assert all(limiter.check_and_increment("k") for _ in range(7))
+    assert not limiter.check_and_increment("k")
+
+
+def _hammer(path, attempts, results):
+    limiter = RateLimiter(5, 60, store=SharedMemoryStore(path, slots=256), sweep_interval=0)
+    results.put(sum(limiter.check_and_increment("10.0.0.1:/auth/login") for _ in range(attempts)))
+
+
+def test_shared_store_enforces_one_limit_across_processes(tmp_path):
+    path = tmp_path / "ratelimit"
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_hammer, args=(path, 10, results)) for _ in range(4)]
+    for proc in workers:
+        proc.start()
+    for proc in workers:
+        proc.join(timeout=30)
+    assert sum(results.get(timeout=5) for _ in workers) == 5
+
+
+def test_shared_store_survives_reopen_and_reuses_idle_slots(tmp_path, caplog):
+    path = tmp_path / "ratelimit"
+    first = RateLimiter(2, 60, store=SharedMemoryStore(path, slots=16), sweep_interval=0)
+    assert first.check_and_increment("k") and first.check_and_increment("k")
+
+    # a restarted worker sees the same state instead of a fresh allowance
+    with caplog.at_level(logging.WARNING, logger="platform-masters"):
+        second = RateLimiter(2, 60, store=SharedMemoryStore(path, slots=1024), sweep_interval=0)
+    assert second.store.groups == first.store.groups
+    # a different RATE_LIMIT_SHARED_SLOTS is reported, not adopted silently
+    assert "has 16 slots, configured 1024" in caplog.text
+    assert not second.check_and_increment("k")
+
+    # a single 16-slot group keeps working for far more keys than slots
+    assert all(second.check_and_increment(f"key-{i}") for i in range(100))
+    second.reset()
+    assert len(second) == 0
+    assert second.check_and_increment("k")
+
+
+def test_default_shared_path_is_per_deployment(monkeypatch):
+    default = rate_limiter_module._default_shared_path()
+    assert f"-{os.getuid()}-" in default.name
+    monkeypatch.setattr(rate_limiter_module, "DATABASE_URL", "postgresql://other/db")
+    assert rate_limiter_module._default_shared_path() != default
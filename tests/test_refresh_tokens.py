@@ -0,0 +1,48 @@
+import pytest
+
+from core.security import hash_refresh_token
+from models import RefreshToken, User, UserVerificationCode
+
+
+@pytest.fixture
+def refresh_token(client, db_session, no_email):
+    client.post(
+        "/auth/register",
+        json={"email": "mobile@skill2win.gg", "nickname": "mobile", "password": "Pass12345", "confirmPassword": "Pass12345"},
+    )
+    code = db_session.query(UserVerificationCode).order_by(UserVerificationCode.id.desc()).first().code
+    client.post("/auth/verify-code", json={"email": "mobile@skill2win.gg", "code": code})
+    resp = client.post("/auth/login", json={"email": "mobile@skill2win.gg", "password": "Pass12345"})
+    assert resp.status_code == 200
+    return resp.json()["refresh_token"]
+
+
+def test_refresh_rotates_and_stores_only_hashes(client, db_session, refresh_token):
+    resp = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["refresh_token"] != refresh_token
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {body['access_token']}"})
+    assert me.json()["email"] == "mobile@skill2win.gg"
+
+    stored = {row.token_hash for row in db_session.query(RefreshToken)}
+    assert stored == {hash_refresh_token(refresh_token), hash_refresh_token(body["refresh_token"])}
+    assert refresh_token not in stored
+
+
+def test_reuse_revokes_whole_family(client, db_session, refresh_token):
+    successor = client.post("/auth/refresh", json={"refresh_token": refresh_token}).json()["refresh_token"]
+
+    replay = client.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert replay.status_code == 401
+    # The legitimate successor dies with the family
+    assert client.post("/auth/refresh", json={"refresh_token": successor}).status_code == 401
+    db_session.expire_all()
+    assert db_session.query(RefreshToken).filter(RefreshToken.revoked_at.is_(None)).count() == 0
+
+
+def test_banned_user_cannot_refresh(client, db_session, refresh_token):
+    db_session.query(User).filter_by(email="mobile@skill2win.gg").update({"is_banned": True})
+    db_session.commit()
+    assert client.post("/auth/refresh", json={"refresh_token": refresh_token}).status_code == 403
+    assert client.post("/auth/refresh", json={"refresh_token": "not-a-token"}).status_code == 401
@@ -0,0 +1,101 @@
+import pytest
+from sqlalchemy import event
+
+from core.revocation import RevocationTable, revocation_table
+from models import User, UserVerificationCode
+
+
+@pytest.fixture
+def stateless(monkeypatch):
+    monkeypatch.setattr("services.user_auth.logic.STATELESS_AUTH", True)
+    monkeypatch.setattr("services.user_auth.dependencies.STATELESS_AUTH", True)
+    # No background poller against the per-test database
+    monkeypatch.setattr(revocation_table, "refresh_interval", 0)
+
+
+def _login_user(client, db_session):
+    client.post(
+        "/auth/register",
+        json={"email": "epoch@skill2win.gg", "nickname": "epoch", "password": "Pass12345", "confirmPassword": "Pass12345"},
+    )
+    code = db_session.query(UserVerificationCode).order_by(UserVerificationCode.id.desc()).first().code
+    client.post("/auth/verify-code", json={"email": "epoch@skill2win.gg", "code": code})
+    token = client.post("/auth/login", json={"email": "epoch@skill2win.gg", "password": "Pass12345"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_protected_is_zero_query_and_ban_revokes(stateless, client, db_session, no_email, admin_headers):
+    headers = _login_user(client, db_session)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        assert client.get("/protected", headers=headers).status_code == 200
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert statements == []
+
+    user_id = db_session.query(User).filter_by(email="epoch@skill2win.gg").one().id
+    client.post("/admin/auth/users/ban", headers=admin_headers, json={"user_id": user_id})
+    assert client.get("/protected", headers=headers).status_code == 401
+    # Unban bumps the epoch again; the old token stays dead
+    client.post("/admin/auth/users/unban", headers=admin_headers, json={"user_id": user_id})
+    assert client.get("/protected", headers=headers).status_code == 401
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_refresh_picks_up_epoch_changes_from_other_workers(db_session):
+    db_session.add(User(nickname="remote", email="remote@skill2win.gg", hashed_password="x"))
+    db_session.commit()
+    table = RevocationTable(refresh_interval=0)
+    assert table.refresh() == 0
+
+    from services.user_auth.logic import bump_token_version
+
+    user_id = db_session.query(User.id).filter_by(email="remote@skill2win.gg").scalar()
+    version = bump_token_version(db_session, user_id)
+    db_session.commit()
+    assert table.refresh() == 1
+    assert table.is_revoked(user_id, version - 1)
+    assert not table.is_revoked(user_id, version)
+
+
+def test_stale_table_falls_back_to_db_epoch(stateless, client, db_session, no_email, monkeypatch):
+    headers = _login_user(client, db_session)
+    user_id = db_session.query(User.id).filter_by(email="epoch@skill2win.gg").scalar()
+    # A polling table that has never refreshed (or stopped refreshing) is not trusted
+    monkeypatch.setattr(revocation_table, "refresh_interval", 60)
+    monkeypatch.setattr(revocation_table, "_start_poller", lambda: None)
+    assert not revocation_table.is_fresh()
+    assert client.get("/protected", headers=headers).status_code == 200
+
+    from services.user_auth.logic import bump_token_version
+
+    # Epoch bumped by another worker: this process's table never heard of it
+    bump_token_version(db_session, user_id)
+    db_session.commit()
+    assert client.get("/protected", headers=headers).status_code == 401
+
+    revocation_table.refresh()
+    assert revocation_table.is_fresh()
+    assert revocation_table.is_revoked(user_id, 0)
+
+
+def test_start_loads_table_before_serving(db_session):
+    db_session.add(User(nickname="early", email="early@skill2win.gg", hashed_password="x"))
+    db_session.commit()
+    from services.user_auth.logic import bump_token_version
+
+    user_id = db_session.query(User.id).filter_by(email="early@skill2win.gg").scalar()
+    version = bump_token_version(db_session, user_id)
+    db_session.commit()
+
+    table = RevocationTable(refresh_interval=60, stale_after=180)
+    assert not table.is_fresh()
+    table.start()
+    try:
+        assert table.is_fresh()
+        assert table.is_revoked(user_id, version - 1)
+    finally:
+        table.stop()
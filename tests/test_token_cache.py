@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+from core import security
+from core.security import TokenCache, create_access_token, decode_token
+
+
+def test_repeat_decode_served_from_cache(monkeypatch):
+    token = create_access_token({"sub": "cache@skill2win.gg"})
+    first = decode_token(token)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("jwt.decode should not run on a cache hit")
+
+    monkeypatch.setattr(security.jwt, "decode", fail)
+    assert decode_token(token) == first
+    # callers get a copy, not the cached dict
+    decode_token(token)["sub"] = "tampered"
+    assert decode_token(token)["sub"] == "cache@skill2win.gg"
+
+
+def test_entries_expire_at_token_exp():
+    cache = TokenCache(max_entries=10)
+    cache.put("fresh", {"sub": "a", "exp": time.time() + 60})
+    cache.put("stale", {"sub": "b", "exp": time.time() - 1})
+    assert cache.get("fresh")["sub"] == "a"
+    assert cache.get("stale") is None
+    assert cache.stats()["size"] == 1
+
+
+def test_size_cap_evicts_least_recently_used():
+    cache = TokenCache(max_entries=2)
+    exp = time.time() + 60
+    for token in ("a", "b", "c"):
+        cache.put(token, {"exp": exp})
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+
+
+def test_expired_token_still_rejected():
+    token = create_access_token({"sub": "old@skill2win.gg"}, expires_delta=timedelta(seconds=-5))
+    with pytest.raises(ValueError):
+        decode_token(token)
@@ -1,3 +1,5 @@
+import pytest
+
 from models import UserVerificationCode
 
 
@@ -89,3 +91,88 @@ def test_kyc_submission_and_admin_verification(client, db_session, no_email):
     assert resp.status_code == 200
     assert resp.json()["is_verified_account"] is True
     assert resp.json()["kyc_verified_at"] is not None
+    assert resp.json()["pesel"] == "90010112345"
+
+    resp = client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"})
+    assert resp.json()["billing_address"] == "Ul. Testowa 1, 00-000 Warszawa"
+
+
+def test_register_maps_unique_violations_to_messages(client, db_session, no_email):
+    body = {"email": "dup@skill2win.gg", "nickname": "dup", "password": "Pass12345", "confirmPassword": "Pass12345"}
+    assert client.post("/auth/register", json=body).status_code == 201
+
+    resp = client.post("/auth/register", json={**body, "nickname": "other"})
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Email już zarejestrowany."
+
+    resp = client.post("/auth/register", json={**body, "email": "other@skill2win.gg"})
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Nick zajęty."
+
+    # Failed attempts leave nothing behind and the session stays usable
+    assert db_session.query(UserVerificationCode).count() == 1
+    assert client.post("/auth/register", json={**body, "email": "fresh@skill2win.gg", "nickname": "fresh"}).status_code == 201
+
+
+def test_duplicate_signup_is_rejected_before_hashing(client, db_session, no_email, monkeypatch):
+    body = {"email": "taken@skill2win.gg", "nickname": "taken", "password": "Pass12345", "confirmPassword": "Pass12345"}
+    assert client.post("/auth/register", json=body).status_code == 201
+
+    async def no_hashing(password):
+        raise AssertionError("duplicate signup reached the hashing pool")
+
+    monkeypatch.setattr("services.user_auth.logic.hash_password_async", no_hashing)
+    resp = client.post("/auth/register", json={**body, "nickname": "other"})
+    assert (resp.status_code, resp.json()["detail"]) == (400, "Email już zarejestrowany.")
+    resp = client.post("/auth/register", json={**body, "email": "other@skill2win.gg"})
+    assert (resp.status_code, resp.json()["detail"]) == (400, "Nick zajęty.")
+
+    # A race past the pre-check still ends at the unique index
+    from fastapi import HTTPException
+
+    from services.user_auth.logic import register_user
+    from services.user_auth.schemas import UserCreate
+
+    with pytest.raises(HTTPException) as exc_info:
+        register_user(db_session, UserCreate(**{**body, "nickname": "racer"}), hashed_password="x")
+    assert (exc_info.value.status_code, exc_info.value.detail) == (400, "Email już zarejestrowany.")
+
+
+def test_register_is_one_transaction(db_session, no_email):
+    from sqlalchemy import event
+
+    from services.user_auth.logic import register_user
+    from services.user_auth.schemas import UserCreate
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper())  # noqa: E731
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    try:
+        user = register_user(
+            db_session,
+            UserCreate(email="one@skill2win.gg", nickname="one", password="Pass12345", confirmPassword="Pass12345"),
+            hashed_password="x",
+        )
+    finally:
+        event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+    assert statements == ["INSERT", "INSERT", "INSERT"]
+    assert user.id and user.email == "one@skill2win.gg"
+    # The returned instance is detached: deferred KYC columns must already be loaded
+    assert user.pesel is None and user.kyc_verified_at is None
+
+
+def test_auth_lookup_skips_kyc_columns(db_session):
+    from sqlalchemy import inspect
+
+    from models import User
+    from services.user_auth.logic import get_user_by_email
+
+    db_session.add(User(nickname="lean", email="lean@skill2win.gg", hashed_password="x", pesel="90010112345"))
+    db_session.commit()
+    db_session.expunge_all()
+
+    lean = get_user_by_email(db_session, "lean@skill2win.gg")
+    assert {"pesel", "bank_account", "kyc_submitted_at"} <= inspect(lean).unloaded
+    db_session.expunge_all()
+    full = get_user_by_email(db_session, "lean@skill2win.gg", with_kyc=True)
+    assert not inspect(full).unloaded
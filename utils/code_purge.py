@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.orm import Session
+
+from config import (
+    CODE_PURGE_BATCH_SIZE,
+    CODE_PURGE_INTERVAL_SECONDS,
+    CODE_PURGE_TIME_BUDGET_SECONDS,
+    OUTBOX_RETENTION_DAYS,
+    REFRESH_TOKEN_REUSE_WINDOW_DAYS,
+)
+from database import SessionLocal
+from models import AdminResetCode, EmailOutbox, RefreshToken, UserVerificationCode
+from utils.logger import logger
+from utils.outbox import STATUS_DEAD, STATUS_SENT
+
+
+def _spent_code(model: Any, now: datetime) -> Any:
+    return or_(model.used.is_(True), model.expires_at <= now)
+
+
+def _finished_outbox(model: Any, now: datetime) -> Any:
+    cutoff = now - timedelta(days=OUTBOX_RETENTION_DAYS)
+    return and_(model.status.in_((STATUS_SENT, STATUS_DEAD)), model.created_at <= cutoff)
+
+
+def _stale_refresh_token(model: Any, now: datetime) -> Any:
+    # Spent tokens stay for the reuse-detection window; a replay after that is a plain 401, not a family revoke
+    cutoff = now - timedelta(days=REFRESH_TOKEN_REUSE_WINDOW_DAYS)
+    return or_(model.expires_at <= now, model.used_at <= cutoff, model.revoked_at <= cutoff)
+
+
+# Which rows of each table are dead weight
+PURGE_RULES: Dict[Any, Callable[[Any, datetime], Any]] = {
+    UserVerificationCode: _spent_code,
+    AdminResetCode: _spent_code,
+    EmailOutbox: _finished_outbox,
+    RefreshToken: _stale_refresh_token,
+}
+PURGED_MODELS = tuple(PURGE_RULES)
+
+
+def _purge_batch(db: Session, model: Any, now: datetime, batch_size: int) -> int:
+    # Small id batches keep every DELETE a short transaction; SKIP LOCKED steps around rows a lookup holds
+    doomed = (
+        select(model.id)
+        .where(PURGE_RULES[model](model, now))
+        .order_by(model.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    result = db.execute(
+        delete(model).where(model.id.in_(doomed)).execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount or 0
+
+
+def purge_codes(
+    *,
+    batch_size: int = CODE_PURGE_BATCH_SIZE,
+    time_budget: float = CODE_PURGE_TIME_BUDGET_SECONDS,
+    session_factory: Callable[[], Session] = SessionLocal,
+    models: Iterable[Any] = PURGED_MODELS,
+) -> Dict[str, Any]:
+    """
+    Delete used and expired code rows (plus stale refresh tokens and old outbox rows) in batches of `batch_size`.
+
+    Stops starting new batches once `time_budget` seconds have passed; whatever
+    is left is picked up by the next run (`complete` is False in that case).
+    """
+    now = datetime.now(timezone.utc)
+    deadline = time.monotonic() + time_budget
+    report: Dict[str, Any] = {"deleted": {}, "batches": 0, "complete": True}
+    with session_factory() as db:
+        for model in models:
+            deleted = 0
+            while True:
+                if time.monotonic() >= deadline:
+                    report["complete"] = False
+                    break
+                removed = _purge_batch(db, model, now, batch_size)
+                report["batches"] += 1
+                deleted += removed
+                if removed < batch_size:
+                    break
+            report["deleted"][model.__tablename__] = deleted
+            if not report["complete"]:
+                break
+    return report
+
+
+class CodePurger:
+    """Background thread running `purge_codes` every `interval` seconds."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = CODE_PURGE_INTERVAL_SECONDS,
+        batch_size: int = CODE_PURGE_BATCH_SIZE,
+        time_budget: float = CODE_PURGE_TIME_BUDGET_SECONDS,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.session_factory = session_factory
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def run_once(self) -> Dict[str, Any]:
+        report = purge_codes(
+            batch_size=self.batch_size, time_budget=self.time_budget, session_factory=self.session_factory
+        )
+        if any(report["deleted"].values()):
+            logger.info("Purged codes: %s (complete=%s)", report["deleted"], report["complete"])
+        return report
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="code-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 10) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                report = self.run_once()
+            except Exception as exc:  # pragma: no cover - keep the purger alive on DB hiccups
+                logger.exception("Code purge iteration failed: %s", exc)
+                report = {"complete": True}
+            # An unfinished run continues right away instead of waiting a full interval
+            if report["complete"]:
+                self._stopped.wait(self.interval)
+
+
+code_purger = CodePurger()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Delete used and expired verification/reset codes, stale refresh tokens and old outbox rows.")
+    parser.add_argument("--batch-size", type=int, default=CODE_PURGE_BATCH_SIZE)
+    parser.add_argument("--time-budget", type=float, default=CODE_PURGE_TIME_BUDGET_SECONDS)
+    parser.add_argument("--until-done", action="store_true", help="repeat runs until nothing is left")
+    args = parser.parse_args(argv)
+
+    while True:
+        report = purge_codes(batch_size=args.batch_size, time_budget=args.time_budget)
+        for table, deleted in report["deleted"].items():
+            print(f"{table}: {deleted} deleted")
+        print(f"batches: {report['batches']}, complete: {report['complete']}")
+        if report["complete"] or not args.until_done:
+            return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
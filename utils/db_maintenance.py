@@ -1,22 +1,36 @@
 from __future__ import annotations
 
 import os
+import re
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
 
-from alembic import command
-from alembic.config import Config
 from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.engine import make_url
 
 from config import DATABASE_URL
 from database import Base, engine
 from utils.logger import logger
 
+if TYPE_CHECKING:
+    from alembic.config import Config
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 ALEMBIC_INI = BASE_DIR / "alembic.ini"
 ALEMBIC_SCRIPT_DIR = BASE_DIR / "alembic"
 
+# Arbitrary but fixed key shared by every worker taking the Postgres advisory lock
+MIGRATION_LOCK_KEY = 0x706D5F6D6967
+_REVISION_RE = re.compile(r'^(down_revision|revision)\s*=\s*(None|["\']([^"\']+)["\'])', re.MULTILINE)
+
 
 def _alembic_config() -> Config:
+    # Alembic (and Mako behind it) is only imported when a migration actually has to run
+    from alembic.config import Config
+
     cfg = Config(str(ALEMBIC_INI))
     cfg.set_main_option("script_location", str(ALEMBIC_SCRIPT_DIR))
     cfg.set_main_option("sqlalchemy.url", DATABASE_URL)
@@ -24,6 +38,105 @@ def _alembic_config() -> Config:
     return cfg
 
 
+@lru_cache(maxsize=1)
+def script_head() -> str | None:
+    """
+    Head revision read straight from `alembic/versions/*.py`.
+
+    Only the `revision`/`down_revision` assignments are scanned, so this avoids
+    building Alembic's ScriptDirectory (which imports every migration). Returns
+    None when there is not exactly one head; callers then take the slow path.
+    """
+    revisions: set[str] = set()
+    parents: set[str] = set()
+    for path in (ALEMBIC_SCRIPT_DIR / "versions").glob("*.py"):
+        found = {name: value for name, _, value in _REVISION_RE.findall(path.read_text(encoding="utf-8"))}
+        if "revision" not in found:
+            continue
+        revisions.add(found["revision"])
+        if found.get("down_revision"):
+            parents.add(found["down_revision"])
+    heads = revisions - parents
+    return heads.pop() if len(heads) == 1 else None
+
+
+def current_revision() -> str | None:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("alembic_version"):
+            return None
+        return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def _lock_file_path() -> Path:
+    database = make_url(DATABASE_URL).database
+    if database and database != ":memory:":
+        return Path(f"{database}.migrate.lock")
+    return Path(tempfile.gettempdir()) / "platform-masters.migrate.lock"
+
+
+@contextmanager
+def migration_lock() -> Iterator[None]:
+    """
+    Single-flight guard for schema changes across worker processes.
+
+    Postgres: session-level advisory lock on a dedicated connection.
+    SQLite: `flock` on a file next to the database (flock locks belong to the
+    open file, so this also serialises threads of one process).
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+                conn.commit()
+        return
+
+    import fcntl
+
+    fd = os.open(_lock_file_path(), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _reset_schema(cfg: Config) -> None:
+    from alembic import command
+
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        md = MetaData()
+        md.reflect(bind=conn)
+        if dialect == "sqlite":
+            conn.execute(text("PRAGMA foreign_keys=OFF"))
+            md.drop_all(bind=conn)
+            conn.execute(text("PRAGMA foreign_keys=ON"))
+        else:
+            md.drop_all(bind=conn)
+
+    command.stamp(cfg, "base")
+    command.upgrade(cfg, "head")
+    Base.metadata.create_all(bind=engine)
+
+
+def _upgrade_schema(cfg: Config) -> None:
+    from alembic import command
+
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("alembic_version"):
+            logger.info("Stamping Alembic base (no alembic_version table found)")
+            command.stamp(cfg, "base")
+    command.upgrade(cfg, "head")
+    # Backfill in case migrations are incomplete
+    Base.metadata.create_all(bind=engine)
+
+
 def ensure_database() -> None:
     """
     Run Alembic migrations.
@@ -35,10 +148,12 @@ def ensure_database() -> None:
 
     Legacy toggle: RESET_DB=1 is treated the same as DB_MAINTENANCE=reset
     to keep backwards compatibility with tests/local scripts.
+
+    In update mode a database already at the script head returns after one
+    SELECT; otherwise exactly one process migrates under `migration_lock`
+    while the others wait and then find the schema at head.
     """
     logger.debug("Initializing database with Alembic")
-    cfg = _alembic_config()
-    dialect = engine.dialect.name
     maintenance_mode = os.getenv("DB_MAINTENANCE", "update").lower()
     if os.getenv("RESET_DB", "0") == "1":
         maintenance_mode = "reset"
@@ -52,29 +167,19 @@ def ensure_database() -> None:
             logger.info("DB_MAINTENANCE=skip -> skipping migrations (assuming managed externally)")
             return
 
-        if maintenance_mode == "reset":
-            logger.info("DB_MAINTENANCE=reset -> dropping all tables (including alembic_version)")
-            with engine.begin() as conn:
-                md = MetaData()
-                md.reflect(bind=conn)
-                if dialect == "sqlite":
-                    conn.execute(text("PRAGMA foreign_keys=OFF"))
-                    md.drop_all(bind=conn)
-                    conn.execute(text("PRAGMA foreign_keys=ON"))
-                else:
-                    md.drop_all(bind=conn)
+        head = script_head()
+        if maintenance_mode == "update" and head is not None and current_revision() == head:
+            logger.info("Database already at %s, skipping migrations", head)
+            return
 
-            command.stamp(cfg, "base")
-            command.upgrade(cfg, "head")
-            Base.metadata.create_all(bind=engine)
-        else:
-            with engine.connect() as conn:
-                if not inspect(conn).has_table("alembic_version"):
-                    logger.info("Stamping Alembic base (no alembic_version table found)")
-                    command.stamp(cfg, "base")
-            command.upgrade(cfg, "head")
-            # Backfill in case migrations are incomplete
-            Base.metadata.create_all(bind=engine)
+        with migration_lock():
+            if maintenance_mode == "reset":
+                logger.info("DB_MAINTENANCE=reset -> dropping all tables (including alembic_version)")
+                _reset_schema(_alembic_config())
+            elif head is not None and current_revision() == head:
+                logger.info("Database migrated to %s by another worker", head)
+            else:
+                _upgrade_schema(_alembic_config())
 
         logger.info("Database maintenance mode '%s' completed successfully", maintenance_mode)
     except Exception as exc:  # pragma: no cover - only during startup
@@ -1,20 +1,123 @@
 from __future__ import annotations
 
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import random
 import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator
+
+from utils.metrics import Sample, metrics
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
 COLOR_FORMAT = "%(asctime)s | %(log_color)s%(levelname)s%(reset)s | %(name)s | %(message_log_color)s%(message)s%(reset)s"
 
+# console (colored, for local work) | json (one compact object per line, for production)
+LOG_OUTPUT = os.getenv("LOG_OUTPUT", "console").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# drop: never wait on a full queue; block: wait up to LOG_QUEUE_BLOCK_SECONDS, then drop
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop").lower()
+LOG_QUEUE_BLOCK_SECONDS = float(os.getenv("LOG_QUEUE_BLOCK_SECONDS", "0.1"))
+# Per-level keep ratio, e.g. "DEBUG=0.01,INFO=0.25"; unlisted levels keep everything
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
 
-def _build_handler() -> logging.Handler:
-    handler = logging.StreamHandler(sys.stdout)
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def _parse_sample_rates(spec: str) -> Dict[int, float]:
+    rates: Dict[int, float] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record; `extra=` fields are included as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fixed share of records per level; runs before enqueueing so dropped records cost nothing more."""
+
+    def __init__(self, rates: Dict[int, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler over a bounded queue with an explicit overflow policy.
+
+    Only the message interpolation happens on the calling thread; formatting
+    and the actual write run on the QueueListener thread. Records that do not
+    fit are counted in `dropped` instead of stalling the request.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *, policy: str = "drop", block_seconds: float = 0.1) -> None:
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self.dropped = 0
+        self.enqueued = 0
+        self._counter_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Freeze the message now (args may change later) but leave formatting to the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.policy == "block":
+                self.queue.put(record, timeout=self.block_seconds)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+            return
+        with self._counter_lock:
+            self.enqueued += 1
+
+
+def _build_formatter() -> logging.Formatter:
+    if LOG_OUTPUT == "json":
+        return JsonFormatter()
     try:
         from colorlog import ColoredFormatter
 
-        formatter = ColoredFormatter(
+        return ColoredFormatter(
             COLOR_FORMAT,
             datefmt="%H:%M:%S",
             secondary_log_colors={
@@ -29,14 +132,51 @@ def _build_handler() -> logging.Handler:
             style="%",
         )
     except Exception:
-        formatter = logging.Formatter(LOG_FORMAT, "%H:%M:%S")
-    handler.setFormatter(formatter)
+        return logging.Formatter(LOG_FORMAT, "%H:%M:%S")
+
+
+def _build_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_build_formatter())
     return handler
 
 
 root = logging.getLogger()
 root.handlers.clear()
 root.setLevel(LOG_LEVEL)
-root.addHandler(_build_handler())
+
+queue_handler = BoundedQueueHandler(
+    queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE)),
+    policy=LOG_QUEUE_POLICY,
+    block_seconds=LOG_QUEUE_BLOCK_SECONDS,
+)
+sampling_filter = SamplingFilter(_parse_sample_rates(LOG_SAMPLE_RATES))
+queue_handler.addFilter(sampling_filter)
+root.addHandler(queue_handler)
+
+listener = QueueListener(queue_handler.queue, _build_handler(), respect_handler_level=True)
+listener.start()
+# Flush whatever is still queued when the process exits
+atexit.register(listener.stop)
+
+
+def logging_stats() -> Dict[str, int]:
+    return {
+        "enqueued": queue_handler.enqueued,
+        "dropped": queue_handler.dropped,
+        "sampled_out": sampling_filter.sampled_out,
+        "queue_depth": queue_handler.queue.qsize(),
+    }
+
+
+def _logging_samples() -> Iterator[Sample]:
+    stats = logging_stats()
+    yield Sample("log_records_enqueued_total", "counter", "Log records handed to the writer thread.", {}, stats["enqueued"])
+    yield Sample("log_records_dropped_total", "counter", "Log records dropped on a full queue.", {}, stats["dropped"])
+    yield Sample("log_records_sampled_out_total", "counter", "Log records skipped by LOG_SAMPLE_RATES.", {}, stats["sampled_out"])
+    yield Sample("log_queue_depth", "gauge", "Log records waiting for the writer thread.", {}, stats["queue_depth"])
+
+
+metrics.register_collector(_logging_samples)
 
 logger = logging.getLogger("platform-masters")
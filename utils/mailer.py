@@ -1,31 +1,299 @@
 from __future__ import annotations
 
 import asyncio
+import threading
+import time
+from concurrent.futures import Future
 from email.message import EmailMessage
+from functools import lru_cache
 from pathlib import Path
 from uuid import uuid4
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Coroutine, Dict, List, Optional, Sequence, Tuple
 
-import aiosmtplib
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-
-from config import SMTP_HOST, SMTP_PASSWORD, SMTP_PORT, SMTP_USER, SENDER_EMAIL
+from config import (
+    SENDER_EMAIL,
+    SMTP_HOST,
+    SMTP_PASSWORD,
+    SMTP_POOL_MAX_IDLE_SECONDS,
+    SMTP_POOL_NOOP_AFTER_SECONDS,
+    SMTP_POOL_SIZE,
+    SMTP_PORT,
+    SMTP_START_TLS,
+    SMTP_TIMEOUT,
+    SMTP_USER,
+)
 from utils.logger import logger
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    import aiosmtplib
+    from jinja2 import Environment
 
+# aiosmtplib and Jinja are imported on first send/render, not when the API boots
 TEMPLATES_DIR = Path(__file__).resolve().parent / "email_templates"
-jinja_env = Environment(
-    loader=FileSystemLoader(TEMPLATES_DIR),
-    autoescape=select_autoescape(["html", "xml"]),
+
+smtp_send_seconds = metrics.histogram(
+    "smtp_send_seconds",
+    "Time to hand one message to the SMTP server, including pool checkout.",
+    ["outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    quantiles=(0.5, 0.95, 0.99),
 )
 
 
-async def send_email(
+@lru_cache(maxsize=1)
+def jinja_env() -> Environment:
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    return Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(["html", "xml"]),
+    )
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated SMTP sessions warm between sends.
+
+    Up to `size` sessions are used concurrently. Idle sessions are reused LIFO;
+    ones idle longer than `noop_after` are probed with NOOP first, and ones idle
+    longer than `max_idle` (or failing the probe) are dropped and reconnected.
+    asyncio transports belong to one event loop, so the pool resets itself when
+    it is used from a different loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        hostname: Optional[str],
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        size: int = 2,
+        max_idle: float = 240.0,
+        noop_after: float = 15.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.size = max(1, size)
+        self.max_idle = max_idle
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.stats = {"connects": 0, "reuses": 0, "noop_failures": 0, "reconnects": 0, "sent": 0}
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions opened on another (possibly closed) loop cannot be reused here
+            for smtp, _ in self._idle:
+                self._discard(smtp)
+            self._idle = []
+            self._semaphore = asyncio.Semaphore(self.size)
+            self._loop = loop
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        import aiosmtplib
+
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        if self.username and self.password:
+            await smtp.login(self.username, self.password)
+        self.stats["connects"] += 1
+        return smtp
+
+    @staticmethod
+    def _discard(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            smtp.close()
+        except Exception:  # pragma: no cover - best effort cleanup
+            pass
+
+    async def _checkout(self) -> Tuple[aiosmtplib.SMTP, bool]:
+        import aiosmtplib
+
+        now = time.monotonic()
+        while self._idle:
+            smtp, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if not smtp.is_connected or idle_for > self.max_idle:
+                self._discard(smtp)
+                continue
+            if idle_for > self.noop_after:
+                try:
+                    await smtp.noop()
+                except (aiosmtplib.SMTPException, OSError):
+                    self.stats["noop_failures"] += 1
+                    self._discard(smtp)
+                    continue
+            self.stats["reuses"] += 1
+            return smtp, True
+        return await self._connect(), False
+
+    async def send_messages(
+        self, messages: Sequence[EmailMessage], *, return_exceptions: bool = False
+    ) -> List[Optional[Exception]]:
+        """
+        Send all messages over a single pooled session.
+
+        By default the first failure is raised. With `return_exceptions=True` every
+        message gets an outcome (None when accepted) and a session lost mid-batch is
+        replaced for the messages that follow.
+        """
+        import aiosmtplib
+
+        self._bind_loop()
+        assert self._semaphore is not None
+        outcomes: List[Optional[Exception]] = []
+        async with self._semaphore:
+            smtp: aiosmtplib.SMTP | None = None
+            try:
+                smtp, reused = await self._checkout()
+                for index, msg in enumerate(messages):
+                    try:
+                        if smtp is None:
+                            smtp = await self._connect()
+                        try:
+                            await smtp.send_message(msg)
+                        except aiosmtplib.SMTPServerDisconnected:
+                            # Only a reused session may have gone stale unnoticed; fresh failures are real
+                            if not (reused and index == 0):
+                                raise
+                            self.stats["reconnects"] += 1
+                            self._discard(smtp)
+                            smtp = None
+                            smtp = await self._connect()
+                            await smtp.send_message(msg)
+                    except Exception as exc:
+                        if not return_exceptions:
+                            raise
+                        outcomes.append(exc)
+                        if smtp is not None and not smtp.is_connected:
+                            self._discard(smtp)
+                            smtp = None
+                        continue
+                    self.stats["sent"] += 1
+                    outcomes.append(None)
+            except BaseException:
+                if smtp is not None:
+                    self._discard(smtp)
+                raise
+            if smtp is not None and smtp.is_connected:
+                self._idle.append((smtp, time.monotonic()))
+        return outcomes
+
+    async def send(self, msg: EmailMessage) -> None:
+        await self.send_messages([msg])
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for smtp, _ in idle:
+            try:
+                await smtp.quit()
+            except Exception:
+                self._discard(smtp)
+
+
+smtp_pool = SMTPConnectionPool(
+    hostname=SMTP_HOST,
+    port=SMTP_PORT,
+    username=SMTP_USER,
+    password=SMTP_PASSWORD,
+    start_tls=SMTP_START_TLS,
+    size=SMTP_POOL_SIZE,
+    max_idle=SMTP_POOL_MAX_IDLE_SECONDS,
+    noop_after=SMTP_POOL_NOOP_AFTER_SECONDS,
+    timeout=SMTP_TIMEOUT,
+)
+
+
+class MailerLoop:
+    """
+    Dedicated event loop running in a background thread for the life of the process.
+
+    All SMTP work is funnelled onto this loop, so the connection pool (whose
+    transports are bound to a loop) is reused across every send instead of being
+    rebuilt by a fresh `asyncio.run` per email.
+    """
+
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._thread is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(loop, ready), name="mailer-loop", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def in_loop(self) -> bool:
+        try:
+            return self._loop is not None and asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """Thread-safe: schedule `coro` on the mailer loop and return a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def stop(self, timeout: float = 10) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None or not thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(smtp_pool.close(), loop).result(timeout)
+        except Exception as exc:  # pragma: no cover - best effort on shutdown
+            logger.warning("Closing SMTP pool failed: %s", exc)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+
+mailer_loop = MailerLoop()
+
+
+def _wait_or_detach(future: Future, wait: bool, timeout: Optional[float]) -> Future:
+    if wait:
+        future.result(timeout)
+    return future
+
+
+def build_email_message(
     subject: str,
     recipient: str,
     text_body: str,
     html_template: Optional[str] = None,
     context: Optional[Dict[str, Any]] = None,
-) -> None:
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = SENDER_EMAIL
     msg["To"] = recipient
@@ -35,25 +303,51 @@ async def send_email(
     msg.set_content(text_body)
 
     if html_template:
-        template = jinja_env.get_template(html_template)
+        template = jinja_env().get_template(html_template)
         html_body = template.render(**(context or {}))
         msg.add_alternative(html_body, subtype="html")
+    return msg
 
-    smtp = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=True)
 
+async def send_email(
+    subject: str,
+    recipient: str,
+    text_body: str,
+    html_template: Optional[str] = None,
+    context: Optional[Dict[str, Any]] = None,
+) -> None:
+    if not mailer_loop.in_loop():
+        # Keep templates rendering and SMTP sessions on the mailer loop regardless of the caller's loop
+        await asyncio.wrap_future(mailer_loop.submit(send_email(subject, recipient, text_body, html_template, context)))
+        return
+    msg = build_email_message(subject, recipient, text_body, html_template, context)
+    start = time.perf_counter()
     try:
-        await smtp.connect()
-        if SMTP_USER and SMTP_PASSWORD:
-            await smtp.login(SMTP_USER, SMTP_PASSWORD)
-        await smtp.send_message(msg)
-        await smtp.quit()
+        await smtp_pool.send(msg)
     except Exception as exc:  # pragma: no cover - network path
+        smtp_send_seconds.observe(time.perf_counter() - start, outcome="error")
         logger.exception("Błąd wysyłki emaila: %s", exc)
         raise
+    smtp_send_seconds.observe(time.perf_counter() - start, outcome="ok")
 
 
-async def send_reset_email_code(recipient_email: str, reset_code: str) -> None:
-    await send_email(
+async def send_messages(messages: Sequence[EmailMessage]) -> List[Optional[Exception]]:
+    """Send prebuilt messages over one pooled session; one outcome per message (None = accepted)."""
+    if not mailer_loop.in_loop():
+        return await asyncio.wrap_future(mailer_loop.submit(send_messages(messages)))
+    if not messages:
+        return []
+    start = time.perf_counter()
+    outcomes = await smtp_pool.send_messages(messages, return_exceptions=True)
+    # Per-message timings are not separable within one session; spread the batch evenly
+    share = (time.perf_counter() - start) / len(messages)
+    for outcome in outcomes:
+        smtp_send_seconds.observe(share, outcome="ok" if outcome is None else "error")
+    return outcomes
+
+
+def _reset_email(recipient_email: str, reset_code: str) -> Dict[str, Any]:
+    return dict(
         subject="Skill2Win | Reset hasła",
         recipient=recipient_email,
         text_body=f"""
@@ -75,24 +369,30 @@ Zespół Skill2Win
     )
 
 
-def send_reset_email_code_sync(recipient_email: str, reset_code: str) -> None:
+def build_reset_email(recipient_email: str, reset_code: str) -> EmailMessage:
+    return build_email_message(**_reset_email(recipient_email, reset_code))
+
+
+async def send_reset_email_code(recipient_email: str, reset_code: str) -> None:
+    await send_email(**_reset_email(recipient_email, reset_code))
+
+
+def send_reset_email_code_sync(
+    recipient_email: str,
+    reset_code: str,
+    *,
+    wait: bool = True,
+    timeout: Optional[float] = SMTP_TIMEOUT,
+) -> Future:
     """
     Synchronous helper for endpoints that are synchronous (FastAPI sync deps).
+    Pass wait=False to fire and forget; the returned future carries the outcome.
     """
-    try:
-        # In worker threads there is usually no running loop.
-        asyncio.run(send_reset_email_code(recipient_email, reset_code))
-    except RuntimeError:
-        # Fallback when called from a thread that already has a loop.
-        loop = asyncio.new_event_loop()
-        try:
-            loop.run_until_complete(send_reset_email_code(recipient_email, reset_code))
-        finally:
-            loop.close()
+    return _wait_or_detach(mailer_loop.submit(send_reset_email_code(recipient_email, reset_code)), wait, timeout)
 
 
-async def send_verification_email_code(recipient_email: str, verification_code: str) -> None:
-    await send_email(
+def _verification_email(recipient_email: str, verification_code: str) -> Dict[str, Any]:
+    return dict(
         subject="Skill2Win | Potwierdź rejestrację",
         recipient=recipient_email,
         text_body=f"""
@@ -114,12 +414,23 @@ Zespół Skill2Win
     )
 
 
-def send_verification_email_code_sync(recipient_email: str, verification_code: str) -> None:
-    try:
-        asyncio.run(send_verification_email_code(recipient_email, verification_code))
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        try:
-            loop.run_until_complete(send_verification_email_code(recipient_email, verification_code))
-        finally:
-            loop.close()
+def build_verification_email(recipient_email: str, verification_code: str) -> EmailMessage:
+    return build_email_message(**_verification_email(recipient_email, verification_code))
+
+
+async def send_verification_email_code(recipient_email: str, verification_code: str) -> None:
+    await send_email(**_verification_email(recipient_email, verification_code))
+
+
+def send_verification_email_code_sync(
+    recipient_email: str,
+    verification_code: str,
+    *,
+    wait: bool = True,
+    timeout: Optional[float] = SMTP_TIMEOUT,
+) -> Future:
+    return _wait_or_detach(
+        mailer_loop.submit(send_verification_email_code(recipient_email, verification_code)),
+        wait,
+        timeout,
+    )
@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+LabelKey = Tuple[str, ...]
+
+
+class Sample(NamedTuple):
+    """One value reported by a collector callback at scrape time."""
+
+    name: str
+    kind: str  # counter | gauge
+    help: str
+    labels: Dict[str, str]
+    value: float
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _dump_value(self, value: Any) -> Any:
+        return value
+
+    def dump(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[list(key), self._dump_value(value)] for key, value in self._values.items()]
+        return {"kind": self.kind, "help": self.help, "labelnames": list(self.labelnames), "series": series}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram: per series, one count per bucket plus the +Inf overflow and a sum.
+
+    Observing is a bisect and two additions under a lock. With `quantiles`, /metrics
+    also reports estimates interpolated from the buckets (the same way PromQL's
+    histogram_quantile does), so p50/p95/p99 are readable without a Prometheus server.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        quantiles: Sequence[float] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        self.quantiles = tuple(quantiles)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _dump_value(self, value: Any) -> Any:
+        return {"counts": list(value[0]), "sum": value[1]}
+
+    def dump(self) -> Dict[str, Any]:
+        return {**super().dump(), "buckets": list(self.buckets), "quantiles": list(self.quantiles)}
+
+
+def estimate_quantile(q: float, buckets: Sequence[float], counts: Sequence[int]) -> float:
+    """Quantile estimate from per-bucket (non-cumulative) counts; NaN when there are no observations."""
+    total = sum(counts)
+    if total == 0:
+        return math.nan
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if index == len(buckets):
+                # Landed in +Inf: the best we can say is "above the last bound"
+                return buckets[-1]
+            lower = buckets[index - 1] if index else 0.0
+            return lower + (buckets[index] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsRegistry:
+    """
+    Process-local metric families plus scrape-time collectors.
+
+    Without a directory, /metrics reports the worker that served the scrape. With
+    `directory` (METRICS_DIR), every worker flushes its state to
+    `<directory>/metrics-<pid>.json` every `flush_interval` seconds and a scrape sums
+    the files of all workers: counters and histograms of exited workers keep counting
+    (so totals never go backwards), gauges only come from live processes. The
+    directory should be emptied on deploy, as with any multiprocess Prometheus setup.
+    """
+
+    def __init__(self, *, directory: str | os.PathLike | None = None, flush_interval: float = METRICS_FLUSH_SECONDS) -> None:
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    def _register(self, cls: type, name: str, help: str, labelnames: Sequence[str], **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with another type or labels")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        *,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        quantiles: Sequence[float] = (),
+    ) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets, quantiles=quantiles)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """`collector` runs on every snapshot; use it for stats that already live elsewhere (pools, queues)."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """This process's families in a JSON-friendly form (the format of the flushed files)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        families = {metric.name: metric.dump() for metric in metrics}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception:  # pragma: no cover - a broken collector must not break the scrape
+                logging.getLogger("platform-masters").exception("Metrics collector %r failed", collector)
+                continue
+            for sample in samples:
+                family = families.setdefault(
+                    sample.name,
+                    {"kind": sample.kind, "help": sample.help, "labelnames": list(sample.labels), "series": []},
+                )
+                family["series"].append([[str(sample.labels[name]) for name in family["labelnames"]], float(sample.value)])
+        return families
+
+    def _file_path(self, pid: int) -> Path:
+        assert self.directory is not None
+        return self.directory / f"metrics-{pid}.json"
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._file_path(os.getpid())
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), separators=(",", ":")))
+        os.replace(tmp, path)
+
+    def _process_snapshots(self) -> Iterator[Tuple[bool, Dict[str, Dict[str, Any]]]]:
+        own = os.getpid()
+        yield True, self.snapshot()
+        if self.directory is None or not self.directory.is_dir():
+            return
+        for path in self.directory.glob("metrics-*.json"):
+            try:
+                pid = int(path.stem.split("-", 1)[1])
+            except ValueError:
+                continue
+            if pid == own:
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # removed or half-written by its owner; picked up on the next scrape
+            yield _pid_alive(pid), data
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Families merged over this process and, with a directory, every other worker's last flush."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for alive, families in self._process_snapshots():
+            for name, family in families.items():
+                if family["kind"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, {**family, "series": {}})
+                if family.get("buckets") != target.get("buckets") or family["labelnames"] != target["labelnames"]:
+                    continue  # layout changed between deploys; keep the first one seen
+                series = target["series"]
+                for labels, value in family["series"]:
+                    key = tuple(labels)
+                    if family["kind"] == "histogram":
+                        current = series.get(key)
+                        if current is None:
+                            series[key] = {"counts": list(value["counts"]), "sum": value["sum"]}
+                        else:
+                            current["counts"] = [a + b for a, b in zip(current["counts"], value["counts"])]
+                            current["sum"] += value["sum"]
+                    else:
+                        series[key] = series.get(key, 0.0) + value
+        return merged
+
+    def render(self) -> str:
+        """Prometheus text exposition (0.0.4) of `collect()`."""
+        self.flush()
+        lines: List[str] = []
+        for name, family in self.collect().items():
+            labelnames = family["labelnames"]
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            if family["kind"] != "histogram":
+                for labels, value in family["series"].items():
+                    lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(value)}")
+                continue
+            buckets = family["buckets"]
+            bounds = [_format_value(bound) for bound in buckets] + ["+Inf"]
+            for labels, value in family["series"].items():
+                cumulative = 0
+                for bound, count in zip(bounds, value["counts"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labelnames, labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+            if family.get("quantiles"):
+                lines.append(f"# HELP {name}_quantile Bucket-interpolated quantile estimate of {name}")
+                lines.append(f"# TYPE {name}_quantile gauge")
+                for labels, value in family["series"].items():
+                    for q in family["quantiles"]:
+                        estimate = estimate_quantile(q, buckets, value["counts"])
+                        lines.append(
+                            f"{name}_quantile{_format_labels(labelnames, labels, [('quantile', repr(q))])} "
+                            f"{_format_value(estimate)}"
+                        )
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Zero every family of this process (tests)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def start(self) -> None:
+        if self.directory is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Final flush so the last requests of an exiting worker are still counted
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:  # pragma: no cover - keep flushing after a transient FS error
+                logging.getLogger("platform-masters").warning("Metrics flush failed: %s", exc)
+
+
+metrics = MetricsRegistry(directory=METRICS_DIR)
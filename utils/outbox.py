@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from config import (
+    OUTBOX_BACKOFF_MAX_SECONDS,
+    OUTBOX_BACKOFF_SECONDS,
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_SECONDS,
+)
+from database import SessionLocal
+from models import EmailOutbox
+from utils import mailer
+from utils.logger import logger
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+KIND_VERIFICATION_CODE = "verification_code"
+KIND_RESET_CODE = "reset_code"
+
+
+def enqueue_email(db: Session, kind: str, recipient: str, **payload: Any) -> EmailOutbox:
+    """
+    Stage an email in the caller's transaction.
+
+    Nothing is sent here: the row becomes visible to the delivery worker only when
+    the caller commits, together with the code it refers to.
+    """
+    entry = EmailOutbox(
+        kind=kind,
+        recipient=recipient,
+        payload=payload,
+        status=STATUS_PENDING,
+        attempts=0,
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    db.add(entry)
+    return entry
+
+
+def _build_message(kind: str, recipient: str, payload: Dict[str, Any]) -> EmailMessage:
+    if kind == KIND_VERIFICATION_CODE:
+        return mailer.build_verification_email(recipient, payload["code"])
+    if kind == KIND_RESET_CODE:
+        return mailer.build_reset_email(recipient, payload["code"])
+    raise ValueError(f"Unknown email kind: {kind}")
+
+
+def _failure(row: Any, exc: BaseException) -> tuple[int, int, Optional[str]]:
+    logger.warning("Outbox delivery %s to %s failed (attempt %s): %s", row.id, row.recipient, row.attempts, exc)
+    return (row.id, row.attempts, str(exc)[:500] or exc.__class__.__name__)
+
+
+async def _send_batch(rows: Sequence[Any]) -> List[tuple[int, int, Optional[str]]]:
+    # The whole batch goes out over one pooled SMTP session; outcomes are still per row
+    results: List[tuple[int, int, Optional[str]]] = []
+    pending: List[Any] = []
+    messages: List[EmailMessage] = []
+    for row in rows:
+        try:
+            messages.append(_build_message(row.kind, row.recipient, row.payload))
+        except Exception as exc:
+            results.append(_failure(row, exc))
+        else:
+            pending.append(row)
+    try:
+        outcomes: List[Optional[Exception]] = await mailer.send_messages(messages)
+    except Exception as exc:
+        # No session at all (e.g. connect/login failed): every message shares the error
+        outcomes = [exc] * len(messages)
+    for row, error in zip(pending, outcomes):
+        results.append((row.id, row.attempts, None) if error is None else _failure(row, error))
+    return results
+
+
+class OutboxWorker:
+    """
+    Background thread draining `email_outbox`.
+
+    Rows are claimed with a single UPDATE ... RETURNING (SKIP LOCKED on Postgres)
+    that also pushes `next_attempt_at` out by a lease, so a worker that dies mid-send
+    leaves its rows to be retried after the lease instead of losing them. Failures
+    back off exponentially; after `max_attempts` a row is dead-lettered.
+    """
+
+    def __init__(
+        self,
+        *,
+        poll_interval: float = OUTBOX_POLL_SECONDS,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_seconds: float = OUTBOX_BACKOFF_SECONDS,
+        backoff_max_seconds: float = OUTBOX_BACKOFF_MAX_SECONDS,
+        lease_seconds: float = OUTBOX_LEASE_SECONDS,
+        session_factory: Callable[[], Session] = SessionLocal,
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lease_seconds = lease_seconds
+        self.session_factory = session_factory
+        self._thread: threading.Thread | None = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.backoff_seconds * 2 ** max(attempts - 1, 0), self.backoff_max_seconds))
+
+    def _claim(self, db: Session) -> List[Any]:
+        now = datetime.now(timezone.utc)
+        due = (
+            select(EmailOutbox.id)
+            .where(EmailOutbox.status == STATUS_PENDING, EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        stmt = (
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due))
+            .values(attempts=EmailOutbox.attempts + 1, next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+            .returning(EmailOutbox.id, EmailOutbox.kind, EmailOutbox.recipient, EmailOutbox.payload, EmailOutbox.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        rows = db.execute(stmt).all()
+        db.commit()
+        return rows
+
+    def _finish(self, db: Session, results: Sequence[tuple[int, int, Optional[str]]]) -> Dict[str, int]:
+        now = datetime.now(timezone.utc)
+        counts = {"sent": 0, "retried": 0, "dead": 0}
+        for entry_id, attempts, error in results:
+            # Finished rows drop the payload so plaintext codes don't outlive delivery
+            if error is None:
+                values: Dict[str, Any] = {"status": STATUS_SENT, "sent_at": now, "last_error": None, "payload": {}}
+                counts["sent"] += 1
+            elif attempts >= self.max_attempts:
+                values = {"status": STATUS_DEAD, "last_error": error, "payload": {}}
+                counts["dead"] += 1
+                logger.error("Outbox message %s dead-lettered after %s attempts: %s", entry_id, attempts, error)
+            else:
+                values = {"next_attempt_at": now + self._backoff(attempts), "last_error": error}
+                counts["retried"] += 1
+            db.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == entry_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+        return counts
+
+    def run_once(self) -> Dict[str, int]:
+        """Claim and deliver one batch; returns per-outcome counts."""
+        with self.session_factory() as db:
+            rows = self._claim(db)
+        if not rows:
+            return {"claimed": 0, "sent": 0, "retried": 0, "dead": 0}
+        future = mailer.mailer_loop.submit(_send_batch(rows))
+        try:
+            results = future.result(self.lease_seconds)
+        except TimeoutError:
+            # Stop the batch before the rows are re-claimed after the lease; a batch left running
+            # would be sent twice and its results never recorded
+            future.cancel()
+            logger.warning("Outbox batch of %s did not finish within the lease; cancelled", len(rows))
+            return {"claimed": len(rows), "sent": 0, "retried": 0, "dead": 0}
+        with self.session_factory() as db:
+            counts = self._finish(db, results)
+        return {"claimed": len(rows), **counts}
+
+    def wake(self) -> None:
+        """Ask the worker to poll now (called after a commit that staged email)."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 10) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                counts = self.run_once()
+            except Exception as exc:  # pragma: no cover - keep the worker alive on DB hiccups
+                logger.exception("Outbox worker iteration failed: %s", exc)
+                counts = {"claimed": 0}
+            if counts["claimed"] >= self.batch_size:
+                continue
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+outbox_worker = OutboxWorker()
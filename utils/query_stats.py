@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import SQL_REPEAT_THRESHOLD, SQL_SLOW_QUERY_MS
+from utils.logger import logger
+from utils.metrics import metrics
+
+_START_KEY = "query_stats_start"
+_MAX_LOGGED_SQL = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# qmark (sqlite), named/pyformat (psycopg), numeric ($1, asyncpg) placeholders
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|(?<!:):\w+|\$\d+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+db_queries_total = metrics.counter("db_queries_total", "SQL statements executed (executemany counts once).")
+db_query_seconds = metrics.histogram(
+    "db_query_seconds",
+    "Time spent in cursor.execute per statement.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+db_slow_queries_total = metrics.counter("db_slow_queries_total", "Statements slower than SQL_SLOW_QUERY_MS.")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """
+    Statement shape with literals and bind markers replaced by `?`.
+
+    Cached by raw text: statements come out of the compiled cache with their
+    parameters bound separately, so the same few strings repeat across requests.
+    """
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    # `IN (?, ?, ?)` of any length is one shape
+    return _IN_LIST.sub("(...)", sql)
+
+
+class QueryStats:
+    """Statements and DB time attributed to one request (or one `capture_queries` block)."""
+
+    def __init__(self, label: str = "") -> None:
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Dict[str, int] = {}
+
+    def record(self, normalized: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.statements[normalized] = self.statements.get(normalized, 0) + 1
+
+    def repeated(self, threshold: int = SQL_REPEAT_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements run at least `threshold` times, most frequent first (likely N+1 loops)."""
+        if threshold <= 0:
+            return []
+        hits = [(sql, count) for sql, count in self.statements.items() if count >= threshold]
+        return sorted(hits, key=lambda item: item[1], reverse=True)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def track_request(label: str) -> Iterator[QueryStats]:
+    """
+    Attribute every statement executed in this context to a fresh QueryStats.
+
+    Starlette copies the context into the endpoint task and into threadpool
+    calls, so sync and async handlers both record into the same object.
+    """
+    stats = QueryStats(label)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Record every statement on instrumented engines while the block runs, from any thread (tests, benchmarks)."""
+    stats = QueryStats("capture")
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+def report_repeats(stats: QueryStats, threshold: int = SQL_REPEAT_THRESHOLD) -> None:
+    for sql, count in stats.repeated(threshold):
+        logger.warning("Statement repeated %sx in %s (possible N+1): %s", count, stats.label, sql[:_MAX_LOGGED_SQL])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get(_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_queries_total.inc()
+    db_query_seconds.observe(elapsed)
+    stats = _current.get()
+    if stats is None and not _captures:
+        if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+            _log_slow(normalize_sql(statement), elapsed, None)
+        return
+    normalized = normalize_sql(statement)
+    if stats is not None:
+        stats.record(normalized, elapsed)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.record(normalized, elapsed)
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        _log_slow(normalized, elapsed, stats)
+
+
+def _on_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_KEY):
+        connection.info[_START_KEY].pop()
+
+
+def _log_slow(normalized: str, elapsed: float, stats: Optional[QueryStats]) -> None:
+    db_slow_queries_total.inc()
+    where = f" in {stats.label}" if stats is not None else ""
+    logger.warning("Slow query (%.1f ms)%s: %s", elapsed * 1000, where, normalized[:_MAX_LOGGED_SQL])
+
+
+def instrument_engine(sync_engine: Engine) -> None:
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _on_error)
@@ -1,43 +1,288 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
 import time
-from collections import defaultdict, deque
-from typing import Deque
+from collections import OrderedDict
+from pathlib import Path
 
-from config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS
+from config import (
+    BASE_DIR,
+    DATABASE_URL,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_REQUESTS,
+    RATE_LIMIT_SHARED_PATH,
+    RATE_LIMIT_SHARED_SLOTS,
+    RATE_LIMIT_SWEEP_SECONDS,
+    RATE_LIMIT_WINDOW_SECONDS,
+)
+from utils.logger import logger
+
+# Absorbs float rounding so a full burst of `max_requests` is never rejected at the edge
+_EPSILON = 1e-9
+
+
+def _gcra(tat: float | None, now: float, interval: float, window: float) -> float | None:
+    """One GCRA step: returns the new theoretical arrival time, or None when throttled."""
+    new_tat = max(tat if tat is not None else now, now) + interval
+    if new_tat - now > window + _EPSILON:
+        return None
+    return new_tat
+
+
+class MemoryStore:
+    """Per-process LRU table of key -> TAT, capped at `max_keys`."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS) -> None:
+        self.max_keys = max_keys
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def acquire(self, key: str, interval: float, window: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            new_tat = _gcra(self._tat.get(key), now, interval, window)
+            if new_tat is None:
+                # Keep throttled keys hot so LRU eviction never hands them a fresh allowance
+                if key in self._tat:
+                    self._tat.move_to_end(key)
+                return False
+            self._tat[key] = new_tat
+            self._tat.move_to_end(key)
+            while len(self._tat) > self.max_keys:
+                self._tat.popitem(last=False)
+        return True
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            idle = [key for key, tat in self._tat.items() if tat <= now]
+            for key in idle:
+                del self._tat[key]
+        return len(idle)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tat.clear()
+
+
+class SharedMemoryStore:
+    """
+    Host-wide TAT table in a memory-mapped file shared by all worker processes.
+
+    The file holds a fixed number of 16-byte slots (8-byte key digest, 8-byte TAT)
+    split into groups of `GROUP_SIZE`. A key hashes to one group; updates lock that
+    group's byte range with `fcntl.lockf` (cross-process) plus a thread lock
+    (POSIX record locks do not exclude threads of the same process). Slots whose
+    TAT has passed are reused, so the table never grows and needs no sweeping to
+    stay correct. Wall-clock time is used because the file outlives processes.
+    """
+
+    MAGIC = b"PMRL"
+    HEADER = struct.Struct("<4sII")
+    SLOT = struct.Struct("<Qd")
+    GROUP_SIZE = 16
+
+    def __init__(self, path: str | os.PathLike, slots: int = RATE_LIMIT_SHARED_SLOTS) -> None:
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = Path(path)
+        groups = max(1, slots // self.GROUP_SIZE)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        # First process to take the lock sizes and stamps the file; later ones adopt its layout
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, self.HEADER.size, 0)
+            if len(header) == self.HEADER.size and header[:4] == self.MAGIC:
+                _, _, existing = self.HEADER.unpack(header)
+                if existing != groups:
+                    logger.warning(
+                        "Rate limit table %s has %s slots, configured %s; using the existing layout "
+                        "(remove the file while all workers are down to resize)",
+                        self.path,
+                        existing * self.GROUP_SIZE,
+                        groups * self.GROUP_SIZE,
+                    )
+                groups = existing
+            else:
+                os.ftruncate(self._fd, self.HEADER.size + groups * self.GROUP_SIZE * self.SLOT.size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, 1, groups), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.HEADER.size, 0)
+        self.groups = groups
+        self._map = mmap.mmap(self._fd, self.HEADER.size + groups * self.GROUP_SIZE * self.SLOT.size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        now = time.time()
+        live = 0
+        for offset in range(self.HEADER.size, len(self._map), self.SLOT.size):
+            digest, tat = self.SLOT.unpack_from(self._map, offset)
+            live += digest != 0 and tat > now
+        return live
+
+    @staticmethod
+    def _digest(key: str) -> int:
+        # 0 marks an empty slot
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
 
+    def _group_bounds(self, group: int) -> tuple[int, int]:
+        length = self.GROUP_SIZE * self.SLOT.size
+        return self.HEADER.size + group * length, length
 
-class InMemoryRateLimiter:
-    def __init__(self, max_requests: int, window_seconds: int) -> None:
+    def acquire(self, key: str, interval: float, window: float) -> bool:
+        digest = self._digest(key)
+        start, length = self._group_bounds(digest % self.groups)
+        with self._lock:
+            self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, length, start)
+            try:
+                now = time.time()
+                target, current = None, None
+                victim, victim_tat = start, float("inf")
+                for offset in range(start, start + length, self.SLOT.size):
+                    slot_digest, tat = self.SLOT.unpack_from(self._map, offset)
+                    if slot_digest == digest:
+                        target, current = offset, tat
+                        break
+                    # Empty slots win; otherwise evict the entry closest to (or already) idle
+                    slot_tat = 0.0 if slot_digest == 0 else tat
+                    if slot_tat < victim_tat:
+                        victim, victim_tat = offset, slot_tat
+                new_tat = _gcra(current, now, interval, window)
+                if new_tat is None:
+                    return False
+                self.SLOT.pack_into(self._map, victim if target is None else target, digest, new_tat)
+                return True
+            finally:
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, length, start)
+
+    def _drop_where(self, predicate) -> int:
+        removed = 0
+        with self._lock:
+            for group in range(self.groups):
+                start, length = self._group_bounds(group)
+                self._fcntl.lockf(self._fd, self._fcntl.LOCK_EX, length, start)
+                try:
+                    for offset in range(start, start + length, self.SLOT.size):
+                        digest, tat = self.SLOT.unpack_from(self._map, offset)
+                        if digest and predicate(tat):
+                            self.SLOT.pack_into(self._map, offset, 0, 0.0)
+                            removed += 1
+                finally:
+                    self._fcntl.lockf(self._fd, self._fcntl.LOCK_UN, length, start)
+        return removed
+
+    def sweep(self) -> int:
+        now = time.time()
+        return self._drop_where(lambda tat: tat <= now)
+
+    def clear(self) -> None:
+        self._drop_where(lambda tat: True)
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class RateLimiter:
+    """
+    GCRA (generic cell rate algorithm) limiter with O(1) state per key.
+
+    Each key stores only its theoretical arrival time (TAT). A request is allowed
+    while the TAT stays within `window_seconds` of now, which admits bursts of up to
+    `max_requests` and then one request per `window_seconds / max_requests`.
+    State lives in a pluggable store; a background sweep drops keys that are back
+    at full allowance.
+    """
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        *,
+        store: MemoryStore | SharedMemoryStore | None = None,
+        sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS,
+    ) -> None:
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._requests: dict[str, Deque[float]] = defaultdict(deque)
+        self.store = store if store is not None else MemoryStore()
+        self.sweep_interval = sweep_interval
+        self._sweeper: threading.Thread | None = None
+        self._sweeper_lock = threading.Lock()
+        self._stop = threading.Event()
 
-    def _prune(self, key: str, now: float) -> None:
-        window_start = now - self.window_seconds
-        dq = self._requests[key]
-        while dq and dq[0] < window_start:
-            dq.popleft()
+    def __len__(self) -> int:
+        return len(self.store)
 
     def check_and_increment(self, key: str) -> bool:
         """
         Returns True if request is allowed, False if rate limit exceeded.
         """
-        now = time.time()
-        self._prune(key, now)
-        dq = self._requests[key]
-        if len(dq) >= self.max_requests:
+        if self._sweeper is None and self.sweep_interval > 0:
+            self._start_sweeper()
+        if self.max_requests <= 0:
             return False
-        dq.append(now)
-        return True
+        return self.store.acquire(key, self.window_seconds / self.max_requests, self.window_seconds)
+
+    def sweep(self) -> int:
+        """Drop keys that are back at full allowance; returns the number removed."""
+        return self.store.sweep()
+
+    def _start_sweeper(self) -> None:
+        with self._sweeper_lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="rate-limit-sweep", daemon=True)
+            self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
 
     def reset(self, *, max_requests: int | None = None, window_seconds: int | None = None) -> None:
-        self._requests.clear()
+        self.store.clear()
         if max_requests is not None:
             self.max_requests = max_requests
         if window_seconds is not None:
             self.window_seconds = window_seconds
 
 
-rate_limiter = InMemoryRateLimiter(
-    max_requests=RATE_LIMIT_REQUESTS,
-    window_seconds=RATE_LIMIT_WINDOW_SECONDS,
-)
+class InMemoryRateLimiter(RateLimiter):
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        *,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+        sweep_interval: float = RATE_LIMIT_SWEEP_SECONDS,
+    ) -> None:
+        super().__init__(max_requests, window_seconds, store=MemoryStore(max_keys), sweep_interval=sweep_interval)
+
+
+def _default_shared_path() -> Path:
+    # One table per deployment (checkout + database) and OS user: other apps or environments on the
+    # host must not share limits, and another user's 0o600 file would not even open
+    base = Path("/dev/shm") if Path("/dev/shm").is_dir() else Path(tempfile.gettempdir())
+    identity = hashlib.blake2b(f"{BASE_DIR}|{DATABASE_URL}".encode(), digest_size=6).hexdigest()
+    return base / f"platform-masters-ratelimit-{os.getuid()}-{identity}"
+
+
+def build_rate_limiter() -> RateLimiter:
+    """
+    RATE_LIMIT_BACKEND=memory (default) keeps state per process;
+    RATE_LIMIT_BACKEND=shared shares one table between all workers on the host.
+    """
+    if RATE_LIMIT_BACKEND == "shared":
+        store = SharedMemoryStore(RATE_LIMIT_SHARED_PATH or _default_shared_path(), RATE_LIMIT_SHARED_SLOTS)
+        return RateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS, store=store)
+    return InMemoryRateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS)
+
+
+rate_limiter = build_rate_limiter()